@@ -2,30 +2,552 @@
 LangGraph-based SQL AI Agent for natural language to SQL translation.
 """
 
+import asyncio
+import copy
+import hashlib
+import inspect
+import json
 import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from contextlib import aclosing
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import ContextVar
+from dataclasses import dataclass, field, fields
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
 from textwrap import dedent
-from typing import TypedDict
-from langchain_community.llms import Ollama
+from typing import AsyncIterator, Callable, Optional
+from groq import AsyncGroq, Groq
 from langchain_groq import ChatGroq
-from langgraph.graph import Graph, StateGraph, END
-from langchain_community.embeddings import OllamaEmbeddings
+from langgraph.graph import StateGraph, END
+from langgraph.graph.state import CompiledStateGraph
+import numpy as np
 
-from sql_tool import SQLTool
+import ollama_client
+from cache import PromptCache
+from config import Config
+from ollama_client import PooledOllama
+from sql_tool import SCHEMA_FOREIGN_KEY_RE, SQLTool
 from rag_tool import RAGTool
 
 logger = logging.getLogger(__name__)
 
+# On-disk cache for the classification example embeddings
+EMBEDDINGS_CACHE_DIR = Path.home() / ".cache" / "sqlagent"
 
-class AgentState(TypedDict):
+# Minimum gap between the two best category scores for the embeddings classifier to decide on its own;
+# closer calls are handed to the LLM classifier as a tie-breaker
+EMBEDDINGS_MIN_MARGIN = 0.05
+
+# Query classification prompts, filled with str.format(query=...)
+GROQ_CLASSIFICATION_PROMPT = dedent("""
+    Classify this query as SQL, RAG, or HYBRID.
+    
+    SQL - wants NAME/NUMBER/RANK only, no description:
+    "Most active user?" → SQL
+    "Película más vista" → SQL
+    "Top 10" → SQL
+    
+    RAG - asks about SPECIFIC named content:
+    "What is Aventuras Galácticas about?" → RAG
+    "De qué trata Terror Nocturno?" → RAG
+    
+    HYBRID - wants content ranking AND description:
+    "De qué trata la película más vista?" → HYBRID
+    "What is the most viewed series about?" → HYBRID
+    
+    Respond with JSON: {{"c": "SQL"}}, {{"c": "RAG"}} or {{"c": "HYBRID"}}
+    
+    Query: "{query}"
+""").strip()
+
+OLLAMA_CLASSIFICATION_PROMPT = dedent("""
+    <|system|>
+    Classify queries: SQL, RAG, or HYBRID.
+    
+    SQL - wants NAME/NUMBER/RANK only, no description:
+    "Most active user?" → SQL
+    "Película más vista" → SQL
+    "Top 10" → SQL
+    "Which is most viewed?" → SQL
+    
+    RAG - asks about SPECIFIC named content:
+    "What is Aventuras Galácticas about?" → RAG
+    "De qué trata Terror Nocturno?" → RAG
+    
+    HYBRID - wants content ranking AND description (must have "content/" + "trata/about/describe"):
+    "De qué trata la película más vista?" → HYBRID
+    "What is the most viewed series about?" → HYBRID
+    "Tell me about the top rated película" → HYBRID
+    
+    Rules:
+    - NO "trata/about/describe" = SQL (even with "más/most")
+    - HYBRID only for content with description request
+    - Users/series/episodes asking for description = SQL (not in RAG)
+    
+    Respond with JSON: {{"c": "SQL"}}, {{"c": "RAG"}} or {{"c": "HYBRID"}}
+    <|end|>
+    <|user|>
+    Query: "{query}"
+    <|end|>
+    <|assistant|>""").strip()
+
+# Keyword prefilter for query classification: queries matching these cues unambiguously are
+# classified without calling the embeddings or LLM classifier (see _prefilter_classification)
+DESCRIPTION_CUE_RE = re.compile(
+    r"\b(?:de\s+qu[ée]\s+(?:trata|tratan|va|van)|about|descri[bp]\w*|plots?|tramas?|sinopsis|"
+    r"summar(?:y|ies)|resumen|tema|story|cu[ée]ntame|h[áa]blame|expl[ií]ca\w*)\b",
+    re.IGNORECASE
+)
+RANKING_CUE_RE = re.compile(
+    r"\b(?:m[áa]s|most|mejor(?:es)?|best|top|highest|lowest|peor(?:es)?|worst|rated|rating|"
+    r"calificad[oa]s?|popular(?:es)?|mayor|menor)\b",
+    re.IGNORECASE
+)
+AGGREGATION_CUE_RE = re.compile(r"\b(?:cu[áa]nt[oa]s?|how\s+many|count|promedio|average|total|lista|list)\b", re.IGNORECASE)
+# Entities without PDFs (descriptions of these are answered with SQL)
+NON_CONTENT_ENTITY_RE = re.compile(r"\b(?:usuarios?|users?|episodios?|episodes?)\b", re.IGNORECASE)
+# Plural content nouns: a description request over a list of content is not a single-title lookup
+CONTENT_LIST_RE = re.compile(r"\b(?:pel[ií]culas|movies|contenidos|series)\b", re.IGNORECASE)
+# Any mention of catalogue content; queries without one (and without a title) can only be about the data
+CONTENT_MENTION_RE = re.compile(
+    r"\b(?:pel[ií]culas?|movies?|films?|series|contenidos?|documental(?:es)?|documentar(?:y|ies)|"
+    r"t[ií]tulos?|titles?|shows?|trama|plot|historia|story)\b",
+    re.IGNORECASE
+)
+# Something that looks like a title: quoted text or two or more consecutive capitalised words
+TITLE_SPAN_RE = re.compile(
+    r"[\"'“«][^\"'”»]+[\"'”»]|\b[A-ZÁÉÍÓÚÑ]\w+(?:\s+(?:(?:de|del|la|el|los|las|en|y|of|the)\s+)?[A-ZÁÉÍÓÚÑ]\w+)+"
+)
+
+# Fused classification + SQL generation prompt (CLASSIFIER_TYPE=fused): one call returns both
+FUSED_CLASSIFICATION_SQL_PROMPT = dedent("""
+    You are a PostgreSQL expert for a streaming platform. Classify the question and, when it needs
+    the database, write the PostgreSQL query that answers it.
+    
+    Question types:
+    - SQL: wants NAME/NUMBER/RANK only, no description ("Most active user?", "Top 10", "Película más vista")
+    - RAG: asks about SPECIFIC named content ("De qué trata Terror Nocturno?", "What is Aventuras Galácticas about?")
+    - HYBRID: wants content ranking AND description ("De qué trata la película más vista?")
+    
+    SQL rules:
+    - Use proper table and column names from the schema
+    - Every non-aggregated column in SELECT must be in GROUP BY
+    - Use COUNT(*) for counting, SUM() for totals, AVG() for averages
+    - For "top N" or "most X" queries: use ORDER BY with LIMIT
+    - For HYBRID questions: ALWAYS include c.titulo (content title) in SELECT
+    - Use proper JOIN syntax with foreign key relationships
+    
+    Database Schema:
+    {schema}
+    
+    Question: {user_query}
+    
+    Respond with JSON: {{"query_type": "SQL", "RAG" or "HYBRID", "sql_query": the query, or null for RAG}}
+""").strip()
+
+# Response formatting prompts
+SQL_CONTEXT_TEMPLATE = dedent("""
+    SQL Query executed:
+    {sql_query}
+    
+    Results:
+    {formatted_results}
+""").strip()
+
+RAG_RESPONSE_PROMPT = dedent("""
+    You are a helpful AI assistant for a streaming platform.
+    
+    The user asked: "{user_query}"
+    
+    {full_context}
+    
+    Provide a clear, informative answer based on the content information above.
+    Be concise but include key details about the content.
+    
+    Response:
+""").strip()
+
+SUMMARY_RESPONSE_PROMPT = dedent("""
+    You are a helpful AI assistant for a streaming platform.
+    
+    The user asked: "{user_query}"
+    
+    {full_context}
+    
+    Provide a brief, friendly summary combining the information above.
+    Be concise but informative. If there are many results, highlight the most relevant ones.
+    
+    Response:
+""").strip()
+
+ERROR_RESPONSE_TEMPLATE = dedent("""
+    I encountered an error while processing your request:
+    
+    ❌ {error_message}
+    
+    Please try rephrasing your question or ask something else.
+""").strip()
+
+# Graph branch taken for each query classification; anything else goes to error handling
+QUERY_TYPE_ROUTES = {"SQL": "sql", "RAG": "rag", "HYBRID": "hybrid"}
+
+# SQL generation: token cap, and stop sequences ending decoding right after the statement
+# (the SQLCoder prompt opens the code fence, so the closing fence also ends its query)
+SQL_MAX_TOKENS = 300
+SQL_STOP = [";"]
+SQLCODER_SQL_STOP = ["```", ";", "\n\n###"]
+
+# Maximum number of LLM requests in flight across concurrent queries (Ollama/Groq batch them server-side)
+MAX_CONCURRENT_LLM_CALLS = 8
+
+# Maximum number of user query embeddings kept for repeated questions
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+
+# Semantic response cache: near-duplicate questions (cosine similarity >= threshold) reuse a recent answer.
+# Opt-in (SEMANTIC_CACHE=true): questions with opposite meanings ("más vista"/"menos vista", "most"/"least")
+# often embed above the threshold, so a hit can return the answer to a different question
+SEMANTIC_CACHE_THRESHOLD = 0.95
+SEMANTIC_CACHE_SIZE = 512
+SEMANTIC_CACHE_TTL = 300
+
+# Exact repeats of a question (ignoring case and whitespace) are answered from an LRU of recent results,
+# without embedding the query; entries expire after SEMANTIC_CACHE_TTL like the semantic cache's
+RESULT_CACHE_SIZE = 128
+
+# Pure SQL results this small are answered from a template instead of the conversation LLM
+DIRECT_ANSWER_MAX_ROWS = 3
+DIRECT_ANSWER_MAX_COLUMNS = 3
+DIRECT_ANSWER_CELL_TYPES = (str, int, float, Decimal, date, datetime)
+DIRECT_ANSWER_NO_ROWS = "The query returned no results."
+
+# Response context budget: when exceeded, SQL rows and then RAG previews are cut down in priority order
+MAX_RESPONSE_CONTEXT_CHARS = 2000
+CONTEXT_TOP_ROWS = 10
+RAG_PREVIEW_CHARS = 500
+RAG_SHORT_PREVIEW_CHARS = 200
+
+# SQL whose select list (before the first FROM) includes the titulo column
+SELECTS_TITLE_RE = re.compile(r"^\s*SELECT\b(?:(?!\bFROM\b).)*?\btitulo\b", re.IGNORECASE | re.DOTALL)
+
+# An unfenced SQL response is complete at the first ';' after its SELECT (the rest is commentary)
+SQL_STATEMENT_END_RE = re.compile(r"\bSELECT\b[^;]*;", re.IGNORECASE)
+
+# Extracts the SQL from a fenced code block, or the first SELECT statement up to ';', a fence or the end
+SQL_RESPONSE_RE = re.compile(r"```(?:sql)?\s*(.*?)```|(\bSELECT\b.*?)(?:;|```|\Z)", re.DOTALL | re.IGNORECASE)
+
+# Schema slimming (slim_schema=True): query words of at least SCHEMA_MATCH_MIN_WORD characters are matched
+# against table names by their first SCHEMA_MATCH_STEM characters ('usuarios' -> 'usuar'), accents ignored
+SCHEMA_MATCH_MIN_WORD = 4
+SCHEMA_MATCH_STEM = 5
+
+# SQL prompts kept pre-rendered per (template, schema, hybrid); slimmed schemas add a few variants each
+SQL_PROMPT_PREFIX_CACHE_SIZE = 32
+
+# SQL generation prompts, dedented once at import and filled with str.format at call time
+GROQ_SQL_PROMPT = dedent("""
+    You are a PostgreSQL expert. Generate ONLY a valid PostgreSQL query.
+    
+    Question: {user_query}
+    
+    Database Schema:
+    {schema}
+    
+    Rules:
+    - Use proper table and column names from the schema
+    - Every non-aggregated column in SELECT must be in GROUP BY
+    - Use COUNT(*) for counting, SUM() for totals, AVG() for averages
+    - For "top N" or "most X" queries: use ORDER BY with LIMIT{hybrid_instruction}
+    - Use proper JOIN syntax with foreign key relationships
+    - Generate ONLY the SQL query, no explanations or markdown
+    
+    SQL Query:
+""").strip()
+
+PHI3_SQL_PROMPT = dedent("""
+    <|system|>
+    You are a PostgreSQL expert. Your task is to generate ONLY a valid PostgreSQL query.
+    
+    Rules:
+    - Use proper table and column names from the schema
+    - Every non-aggregated column in SELECT must be in GROUP BY
+    - Use COUNT(*) for counting, SUM() for totals, AVG() for averages
+    - For "top N" or "most X" queries: use ORDER BY with LIMIT{hybrid_instruction}
+    - Use proper JOIN syntax with foreign key relationships
+    - Generate ONLY the SQL query, no explanations or markdown
+    <|end|>
+    <|user|>
+    Question: {user_query}
+    
+    Database Schema:
+    {schema}
+    
+    Generate a PostgreSQL query to answer the question. Output ONLY the SQL query:
+    <|end|>
+    <|assistant|>
+    SELECT
+""").strip()
+
+PHI3_HYBRID_INSTRUCTION = "\n- CRITICAL: ALWAYS include c.titulo (content title) in SELECT for ranking queries"
+
+SQLCODER_SQL_PROMPT = dedent("""
+    ### Instructions:
+    Your task is to convert a question into a SQL query, given a PostgreSQL database schema.
+    Adhere to these rules:
+    - **Deliberately go through the question and database schema word by word** to appropriately answer the question
+    - **Use Table Aliases** to prevent ambiguity. For example, `SELECT table1.col1, table2.col1 FROM table1 JOIN table2 ON table1.id = table2.id`
+    - When creating a ratio, always cast the numerator as float
+    - **CRITICAL PostgreSQL GROUP BY rule**: Every non-aggregated column in SELECT must appear in GROUP BY
+      * If you SELECT c.titulo, c.id_contenido and use COUNT(*), you must GROUP BY c.titulo, c.id_contenido
+      * If you SELECT c.titulo and use COUNT(*), you must GROUP BY c.titulo
+    - Prefer simple queries over complex window functions when possible
+    - For "most viewed" or "most popular" queries, use COUNT(*), GROUP BY, ORDER BY, and LIMIT{hybrid_instruction}
+    - Use COUNT(*) for counting rows, SUM() for totals, AVG() for averages
+    - Generate ONLY valid PostgreSQL syntax
+    - Do NOT include explanations, comments, or additional text after the SQL query
+    
+    ### Input:
+    Generate a SQL query that answers the question `{user_query}`.
+    This query will run on a PostgreSQL database whose schema is represented below:
+    {schema}
+    
+    ### Response:
+    Based on your instructions, here is the SQL query I have generated to answer the question `{user_query}`:
+    ```sql
+""").strip()
+
+SQLCODER_HYBRID_INSTRUCTION = "\n- **CRITICAL for ranking queries**: ALWAYS include c.titulo (content title) in SELECT clause"
+
+DEFAULT_SQL_PROMPT = dedent("""
+    You are a PostgreSQL expert. Generate ONLY a valid SQL query.
+    
+    Question: {user_query}
+    
+    Database Schema:
+    {schema}
+    
+    Generate a PostgreSQL query. Rules:
+    - Every non-aggregated column in SELECT must be in GROUP BY
+    - Use COUNT(*), SUM(), AVG() for aggregations
+    - Use ORDER BY with LIMIT for "top N" queries{hybrid_instruction}
+    - Output ONLY the SQL query, no explanations
+    
+    SQL Query:
+""").strip()
+
+DEFAULT_HYBRID_INSTRUCTION = "\n- CRITICAL: Include c.titulo (content title) in SELECT for ranking queries"
+
+
+@dataclass(slots=True)
+class AgentState:
     """State of the agent graph."""
-    user_query: str
-    query_type: str  # 'SQL', 'RAG', or 'HYBRID'
-    sql_query: str
-    sql_results: dict
-    rag_results: dict
-    retrieved_docs: list
-    formatted_response: str
-    error: str
+    user_query: str = ""
+    query_embedding: Optional[list] = None  # embedded once, shared by cache lookup, classifier and RAG search
+    query_type: str = ""  # 'SQL', 'RAG', or 'HYBRID'
+    sql_query: str = ""
+    sql_results: dict = field(default_factory=dict)
+    rag_results: dict = field(default_factory=dict)
+    retrieved_docs: list = field(default_factory=list)
+    formatted_response: str = ""
+    error: str = ""
+
+
+AGENT_STATE_FIELDS = tuple(f.name for f in fields(AgentState))
+
+
+def _state_delta(before: tuple, state: AgentState) -> dict:
+    """
+    Fields a node assigned since the before snapshot. Nodes replace field values rather than
+    mutating them in place, so an identity check is enough. Returning a dict lets LangGraph write
+    only these channels (a dataclass output is read field by field through get_type_hints).
+    """
+    return {
+        name: value
+        for name, old, value in zip(AGENT_STATE_FIELDS, before, (getattr(state, name) for name in AGENT_STATE_FIELDS))
+        if value is not old
+    }
+
+
+def _sql_response_complete(text: str) -> bool:
+    """Whether a partial SQL model response already holds the whole statement _clean_sql_response() extracts."""
+    fence = text.find("```")
+    if fence != -1:
+        return text.find("```", fence + 3) != -1
+    return SQL_STATEMENT_END_RE.search(text) is not None
+
+
+def _normalize_query(text: str) -> str:
+    """Cache key of a user query: lowercased, with runs of whitespace collapsed."""
+    return " ".join(text.lower().split())
+
+
+def _fold_accents(text: str) -> str:
+    """Lowercase text and strip accents, so 'Galácticas' and 'galacticas' compare equal."""
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii").lower()
+
+
+class LLMCallPool:
+    """
+    Multiplexes the LLM calls of concurrent queries onto a bounded number of in-flight requests,
+    which the Ollama/Groq servers batch together. A call identical to one already in flight
+    (same model and prompt) awaits that request instead of sending another one.
+    Must be used from a single event loop (the agent's).
+    """
+    
+    def __init__(self, limit: int = MAX_CONCURRENT_LLM_CALLS):
+        self._slots = asyncio.Semaphore(limit)
+        self._in_flight = {}
+    
+    @staticmethod
+    def _text(response) -> str:
+        # Handle both string responses and ChatGroq message objects
+        return response.content if hasattr(response, 'content') else str(response)
+    
+    @classmethod
+    def _stream_text(cls, llm, prompt: str) -> AsyncIterator[str]:
+        # Pooled Ollama models are read directly, without LangChain's per-chunk callback machinery
+        if isinstance(llm, PooledOllama):
+            return llm.astream_text(prompt)
+        return (cls._text(chunk) async for chunk in llm.astream(prompt))
+    
+    async def _invoke(self, llm, prompt: str, until: Optional[Callable[[str], bool]]) -> str:
+        async with self._slots:
+            if until is None:
+                if isinstance(llm, PooledOllama):
+                    return await llm.agenerate_text(prompt)
+                return self._text(await llm.ainvoke(prompt))
+            text = ""
+            async with aclosing(self._stream_text(llm, prompt)) as stream:
+                async for chunk in stream:
+                    text += chunk
+                    if until(text):
+                        # Closing the stream ends the request, so the model stops generating
+                        break
+            return text
+    
+    def _done(self, key: tuple, task: asyncio.Task):
+        self._in_flight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # mark as retrieved even if every waiter was cancelled
+    
+    async def ainvoke(self, llm, prompt: str, until: Optional[Callable[[str], bool]] = None) -> str:
+        """
+        Invoke the LLM (or join the identical call in flight) and return the response text.
+        With until, the response is streamed and cut off as soon as until(text so far) is true.
+        """
+        key = (id(llm), prompt)
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._invoke(llm, prompt, until))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        # A cancelled waiter must not cancel the request other queries are waiting on
+        return await asyncio.shield(task)
+    
+    async def astream(self, llm, prompt: str) -> AsyncIterator[str]:
+        """Stream the response text of the LLM chunk by chunk, holding one request slot."""
+        async with self._slots:
+            async with aclosing(self._stream_text(llm, prompt)) as stream:
+                async for chunk in stream:
+                    yield chunk
+
+
+class SemanticQueryCache:
+    """
+    Thread-safe cache of agent results looked up by query embedding similarity.
+    Embeddings are kept in one float32 matrix so a lookup is a single mat-vec; entries expire after
+    ttl seconds and the least recently used entry is evicted when the cache is full.
+    Queries mentioning different numbers ("top 5" vs "top 10") never match each other, but queries that
+    only differ in a word like "most"/"least" can, so the agent only uses this cache when asked to.
+    """
+    
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD, maxsize: int = SEMANTIC_CACHE_SIZE,
+                 ttl: float = SEMANTIC_CACHE_TTL):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._vectors = None
+        self._results = []
+        self._numbers = []
+        self._created = np.zeros(maxsize)
+        self._last_used = np.zeros(maxsize)
+        self._lock = threading.RLock()
+    
+    @staticmethod
+    def _normalize(embedding: list) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+    
+    def get(self, embedding: list, query: str) -> Optional[dict]:
+        """Return the cached result of the most similar recent query, or None."""
+        vector = self._normalize(embedding)
+        with self._lock:
+            if vector is None or not self._results:
+                return None
+            similarities = self._vectors[:len(self._results)] @ vector
+            best = int(np.argmax(similarities))
+            now = time.monotonic()
+            if (similarities[best] < self.threshold
+                    or now - self._created[best] > self.ttl
+                    or self._numbers[best] != re.findall(r"\d+", query)):
+                return None
+            self._last_used[best] = now
+            logger.info("Semantic cache hit (similarity: %.4f)", similarities[best])
+            return copy.deepcopy(self._results[best])
+    
+    def put(self, embedding: list, query: str, result: dict):
+        """Store a result, replacing the least recently used (or expired) entry when full."""
+        vector = self._normalize(embedding)
+        if vector is None:
+            return
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.maxsize, vector.shape[0]), dtype=np.float32)
+            if len(self._results) < self.maxsize:
+                index = len(self._results)
+                self._results.append(None)
+                self._numbers.append(None)
+            else:
+                index = int(np.argmin(self._last_used))
+            now = time.monotonic()
+            self._vectors[index] = vector
+            self._results[index] = copy.deepcopy(result)
+            self._numbers[index] = re.findall(r"\d+", query)
+            self._created[index] = now
+            self._last_used[index] = now
+
+
+# Compiled graphs are shared by every agent: the topology only depends on the classifier node,
+# and the nodes dispatch to the agent processing the current query through _current_agent
+_GRAPH_CACHE = {}
+_GRAPH_CACHE_LOCK = threading.Lock()
+_current_agent = ContextVar("sqlagent_current_agent")
+
+# Callback receiving the response text chunk by chunk while astream_query() is consuming the graph
+_response_sink = ContextVar("sqlagent_response_sink", default=None)
+
+
+def _agent_node(method_name: str):
+    """
+    Wrap an SQLAgent method as a graph node/edge bound to the agent running the current query.
+    Nodes (async methods returning the state) report only the fields they changed.
+    """
+    if inspect.iscoroutinefunction(getattr(SQLAgent, method_name)):
+        async def node(state):
+            before = tuple(getattr(state, name) for name in AGENT_STATE_FIELDS)
+            result = await getattr(_current_agent.get(), method_name)(state)
+            return _state_delta(before, state) if result is state else result
+    else:
+        def node(state):
+            return getattr(_current_agent.get(), method_name)(state)
+    node.__name__ = method_name
+    return node
 
 
 class SQLAgent:
@@ -45,7 +567,14 @@ class SQLAgent:
         groq_api_key: str = None,
         groq_sql_model: str = None,
         groq_conversation_model: str = None,
-        groq_classifier_model: str = None
+        groq_classifier_model: str = None,
+        use_result_cache: bool = True,
+        use_semantic_cache: bool = False,
+        fuse_sql_generation: bool = False,
+        direct_sql_answers: bool = True,
+        ollama_keep_alive: str = Config.ollama_keep_alive,
+        schema_cache_ttl: float = Config.schema_cache_ttl,
+        slim_schema: bool = False
     ):
         """
         Initialize the SQL Agent.
@@ -63,6 +592,14 @@ class SQLAgent:
             groq_sql_model: Model name for SQL generation on Groq (default: llama-3.1-8b-instant)
             groq_conversation_model: Model name for conversation on Groq (default: llama-3.1-8b-instant)
             groq_classifier_model: Model name for classification on Groq (default: llama-3.1-8b-instant)
+            use_result_cache: Whether to answer exact repeats of a query (ignoring case and whitespace) from a short-lived result cache (default: True)
+            use_semantic_cache: Whether to also answer near-duplicate queries from a short-lived response cache; requires RAG embeddings and can
+                return the answer to a similar but different question, e.g. "most" vs "least" viewed (default: False)
+            fuse_sql_generation: Whether to classify the query and generate its SQL in a single LLM call (default: False)
+            direct_sql_answers: Whether small pure SQL results are answered from a template without the conversation LLM (default: True)
+            ollama_keep_alive: How long Ollama keeps the models loaded after a request, e.g. '30m' or '-1m' for indefinitely (default: '30m')
+            schema_cache_ttl: Seconds the database schema is reused before it is fetched again (default: 300)
+            slim_schema: Whether SQL prompts only include the tables the query names and the tables they join with (default: False)
         """
         self.sql_tool = SQLTool(db_config)
         self.ollama_base_url = ollama_base_url
@@ -70,6 +607,27 @@ class SQLAgent:
         self.conversation_model = conversation_model
         self.classifier_model = classifier_model if classifier_model else conversation_model
         self.use_embeddings_classifier = use_embeddings_classifier
+        self.fuse_sql_generation = fuse_sql_generation
+        self.direct_sql_answers = direct_sql_answers
+        self.ollama_keep_alive = ollama_keep_alive
+        
+        # Database schema cache (see _get_schema)
+        self.schema_cache_ttl = schema_cache_ttl
+        self._schema_cache = None
+        self._schema_cache_ts = 0.0
+        self._schema_refresh = None
+        self.slim_schema = slim_schema
+        # (schema, tables, join links, slimmed schemas by table set) for the current schema version
+        self._schema_index = None
+        
+        # Prompt-level caches: classification label and cleaned SQL for prompts already seen; query
+        # embeddings are cached for the RAG tool's searches too
+        self._classification_cache = PromptCache()
+        self._sql_cache = PromptCache()
+        self._query_embedding_cache = PromptCache(QUERY_EMBEDDING_CACHE_SIZE)
+        
+        # Bounded, coalescing LLM calls shared by all queries running on the agent's loop
+        self._llm_calls = LLMCallPool()
         
         # Model provider configuration
         self.model_provider = model_provider.lower()
@@ -78,21 +636,112 @@ class SQLAgent:
         self.groq_conversation_model = groq_conversation_model or "llama-3.1-8b-instant"
         self.groq_classifier_model = groq_classifier_model or "llama-3.1-8b-instant"
         
-        # Initialize RAG tool
-        self._init_rag_tool(rag_config, ollama_base_url)
-
-        # Initialize LLMs
-        self._init_models()
+        # SQL prompt format for the configured model, resolved once instead of on every query
+        if self.model_provider == "groq" or 'phi3' in self.sql_model.lower():
+            # Groq chat models use a clean format, Phi3 its specific template with special tokens
+            self._create_sql_prompt = self._create_phi3_prompt
+        elif 'sqlcoder' in self.sql_model.lower():
+            # SQLCoder uses ### Instructions format
+            self._create_sql_prompt = self._create_sqlcoder_prompt
+        else:
+            # Default prompt for other models
+            self._create_sql_prompt = self._create_default_prompt
+        # SQL prompts with the schema filled in, split around the question; LRU keyed by (template, schema, hybrid)
+        self._sql_prompt_prefixes = OrderedDict()
+        
+        # Groq SDK clients shared by all Groq models (see _init_models)
+        self._groq_client = None
+        self._groq_async_client = None
+        
+        # Classifier node of the (shared) compiled graph for the configured classifier
+        if self.fuse_sql_generation:
+            classifier_node = "_classify_and_generate_sql"
+        elif self.use_embeddings_classifier:
+            classifier_node = "_classify_query_embeddings"
+        else:
+            classifier_node = "_classify_query"
+        
+        # Initialize the RAG tool (Chroma + PDF embeddings) and the LLMs concurrently, they are independent.
+        # The graph only binds the agent at query time, so it is compiled (first agent only) alongside them.
+        # The schema is prefetched too, so the first query skips the fetch (a failure is retried on first use).
+        with ThreadPoolExecutor(max_workers=4, thread_name_prefix="sqlagent-init") as executor:
+            rag_future = executor.submit(self._init_rag_tool, rag_config, ollama_base_url)
+            models_future = executor.submit(self._init_models)
+            graph_future = executor.submit(self._get_compiled_graph, classifier_node)
+            executor.submit(self._get_schema)
+            rag_future.result()
+            models_future.result()
+            self.graph = graph_future.result()
+        
+        # Query embedder for the embeddings classifier: reuse the RAG tool's client (same model and server)
+        self._embedder = self.rag_tool.embeddings if self.rag_tool else None
+        
+        # Titles of the documents in the RAG store, matched by the keyword prefilter
+        self._known_title_re = self._build_title_pattern()
+        
+        # Response caches: exact repeats keyed by the normalized query, near-duplicates by the query embedding
+        self._result_cache = PromptCache(RESULT_CACHE_SIZE) if use_result_cache else None
+        self._response_cache = SemanticQueryCache() if use_semantic_cache and self._embedder else None
 
-        # Build the graph
-        self.graph = self._build_graph()
+        # Background event loop for the synchronous query() wrapper. Keeping a single loop
+        # lets the pooled async HTTP clients keep their connections alive across queries.
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="sqlagent-loop", daemon=True).start()
         
-        # Initialize query classification examples only if using embeddings classifier
+        # Load the Ollama models in the background so the first query does not pay for it
+        if self.model_provider == "ollama":
+            asyncio.run_coroutine_threadsafe(self._warm_up_models(), self._loop)
+        
+        # Initialize query classification examples only if using embeddings classifier.
+        # Pre-computing their embeddings runs in the background; the classifier waits for it.
+        self._emb_matrix = None
+        self._emb_ready = None
         if self.use_embeddings_classifier:
-            self._init_classification_examples()
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlagent-emb")
+            self._emb_ready = executor.submit(self._init_classification_examples)
+            executor.shutdown(wait=False)
         
-        logger.info(f"SQLAgent initialized with provider: {self.model_provider}, SQL model: {sql_model if self.model_provider == 'ollama' else self.groq_sql_model}, Conversation model: {conversation_model if self.model_provider == 'ollama' else self.groq_conversation_model}, Classifier model: {self.classifier_model if self.model_provider == 'ollama' else self.groq_classifier_model}, Use embeddings classifier: {self.use_embeddings_classifier}")
-    
+        ollama = self.model_provider == 'ollama'
+        logger.info(
+            "SQLAgent initialized with provider: %s, SQL model: %s, Conversation model: %s, Classifier model: %s, Use embeddings classifier: %s",
+            self.model_provider,
+            sql_model if ollama else self.groq_sql_model,
+            conversation_model if ollama else self.groq_conversation_model,
+            self.classifier_model if ollama else self.groq_classifier_model,
+            self.use_embeddings_classifier
+        )
+
+    @classmethod
+    def from_config(cls, config: Config, **overrides) -> "SQLAgent":
+        """
+        Create an agent from a validated Config.
+
+        Args:
+            config: Settings parsed once by Config.from_env()
+            **overrides: Constructor arguments that take precedence over the config (e.g. use_semantic_cache)
+        """
+        kwargs = dict(
+            db_config=config.db_config,
+            ollama_base_url=config.ollama_base_url,
+            sql_model=config.sql_model,
+            conversation_model=config.conversation_model,
+            classifier_model=config.classifier_model,
+            rag_config=config.rag_config,
+            use_embeddings_classifier=config.classifier_type == "embeddings",
+            model_provider=config.model_provider,
+            groq_api_key=config.groq_api_key,
+            groq_sql_model=config.groq_sql_model,
+            groq_conversation_model=config.groq_conversation_model,
+            groq_classifier_model=config.groq_classifier_model,
+            fuse_sql_generation=config.classifier_type == "fused",
+            ollama_keep_alive=config.ollama_keep_alive,
+            schema_cache_ttl=config.schema_cache_ttl,
+            slim_schema=config.slim_schema,
+            use_semantic_cache=config.semantic_cache
+        )
+        kwargs.update(overrides)
+        return cls(**kwargs)
+
     def _init_rag_tool(self, rag_config: dict, ollama_base_url: str):
         # Initialize RAG tool if config provided
         self.rag_tool = None
@@ -102,11 +751,13 @@ class SQLAgent:
                     summaries_dir=rag_config['summaries_dir'],
                     ollama_base_url=ollama_base_url,
                     embedding_model=rag_config['embedding_model'],
-                    chroma_db_dir=rag_config['chroma_db_dir']
+                    chroma_db_dir=rag_config['chroma_db_dir'],
+                    keep_alive=self.ollama_keep_alive,
+                    embedding_cache=self._query_embedding_cache
                 )
                 logger.info("RAG functionality enabled")
             except Exception as e:
-                logger.warning(f"RAG initialization failed, continuing without RAG: {e}")
+                logger.warning("RAG initialization failed, continuing without RAG: %s", e)
                 self.rag_tool = None
 
     def _init_models(self):
@@ -116,71 +767,125 @@ class SQLAgent:
             if not self.groq_api_key:
                 raise ValueError("Groq API key is required when using model_provider='groq'")
             
-            logger.info(f"Initializing Groq models: SQL={self.groq_sql_model}, Conversation={self.groq_conversation_model}, Classifier={self.groq_classifier_model}")
+            logger.info("Initializing Groq models: SQL=%s, Conversation=%s, Classifier=%s", self.groq_sql_model, self.groq_conversation_model, self.groq_classifier_model)
+            
+            # One Groq client pair (one keep-alive HTTP connection pool each) shared by every model,
+            # instead of ChatGroq opening separate clients per model
+            self._groq_client = Groq(api_key=self.groq_api_key)
+            self._groq_async_client = AsyncGroq(api_key=self.groq_api_key)
+            groq_clients = {
+                "client": self._groq_client.chat.completions,
+                "async_client": self._groq_async_client.chat.completions
+            }
             
             # SQL model for query generation (low temperature for precision)
             self.sql_llm = ChatGroq(
-                api_key=self.groq_api_key,
+                **groq_clients,
                 model=self.groq_sql_model,
                 temperature=0,
-                max_tokens=500
+                max_tokens=SQL_MAX_TOKENS,
+                stop=SQL_STOP
             )
             
             # Conversation model for response generation (higher temperature for natural language)
             self.conversation_llm = ChatGroq(
-                api_key=self.groq_api_key,
+                **groq_clients,
                 model=self.groq_conversation_model,
                 temperature=0.7,
                 max_tokens=1000
             )
             
             # Classifier model for query type classification (low temperature for consistency)
+            # JSON mode constrains the output to a single {"c": ...} object
             self.classifier_llm = ChatGroq(
-                api_key=self.groq_api_key,
+                **groq_clients,
                 model=self.groq_classifier_model,
                 temperature=0,
-                max_tokens=10
+                max_tokens=15,
+                model_kwargs={"response_format": {"type": "json_object"}}
             )
             
+            if self.fuse_sql_generation:
+                # Fused classifier + SQL generator: SQL model in JSON mode, room for the query
+                self.fused_llm = ChatGroq(
+                    **groq_clients,
+                    model=self.groq_sql_model,
+                    temperature=0,
+                    max_tokens=500,
+                    model_kwargs={"response_format": {"type": "json_object"}}
+                )
+            
         else:
             # Initialize Ollama models with model-specific optimizations
-            logger.info(f"Initializing Ollama models: SQL={self.sql_model}, Conversation={self.conversation_model}, Classifier={self.classifier_model}")
+            logger.info("Initializing Ollama models: SQL=%s, Conversation=%s, Classifier=%s", self.sql_model, self.conversation_model, self.classifier_model)
             
             if 'phi3' in self.sql_model.lower():
                 # Phi3 optimizations: lower temperature, shorter context
-                self.sql_llm = Ollama(
+                self.sql_llm = PooledOllama(
                     model=self.sql_model,
                     base_url=self.ollama_base_url,
+                    keep_alive=self.ollama_keep_alive,
                     temperature=0,
-                    num_predict=500,
+                    num_predict=SQL_MAX_TOKENS,
+                    stop=SQL_STOP,
                     top_k=5,
                     top_p=0.7,
                     repeat_penalty=1.0
                 )
             else:
                 # SQLCoder and other models
-                self.sql_llm = Ollama(
+                self.sql_llm = PooledOllama(
                     model=self.sql_model,
                     base_url=self.ollama_base_url,
+                    keep_alive=self.ollama_keep_alive,
                     temperature=0,
-                    num_predict=500  # Allow longer SQL queries
+                    num_predict=SQL_MAX_TOKENS,
+                    stop=SQLCODER_SQL_STOP if 'sqlcoder' in self.sql_model.lower() else SQL_STOP
                 )
             
-            self.conversation_llm = Ollama(
+            self.conversation_llm = PooledOllama(
                 model=self.conversation_model,
                 base_url=self.ollama_base_url,
+                keep_alive=self.ollama_keep_alive,
                 temperature=0.7
             )
             
-            self.classifier_llm = Ollama(
+            # JSON format makes Ollama apply a grammar, so the output is always a {"c": ...} object
+            self.classifier_llm = PooledOllama(
                 model=self.classifier_model,
                 base_url=self.ollama_base_url,
+                keep_alive=self.ollama_keep_alive,
                 temperature=0,
-                num_predict=6,
+                num_predict=12,
                 top_k=3,
                 top_p=0.5,
-                repeat_penalty=1.0
+                repeat_penalty=1.0,
+                format="json"
             )
+            
+            if self.fuse_sql_generation:
+                # Fused classifier + SQL generator: SQL model in JSON mode, room for the query
+                self.fused_llm = PooledOllama(
+                    model=self.sql_model,
+                    base_url=self.ollama_base_url,
+                    keep_alive=self.ollama_keep_alive,
+                    temperature=0,
+                    num_predict=500,
+                    format="json"
+                )
+
+    async def _warm_up_models(self):
+        """Load every Ollama model the agent uses (LLMs and embeddings), so none is loaded on a user query."""
+        models = list({self.sql_model, self.conversation_model, self.classifier_model})
+        warm_ups = [ollama_client.awarm_up(self.ollama_base_url, model, self.ollama_keep_alive) for model in models]
+        if self._embedder is not None:
+            # Embedding models cannot generate: embedding a short text loads them (with the same keep_alive)
+            models.append(self._embedder.model)
+            warm_ups.append(self._embedder.aembed_query("warm up"))
+        results = await asyncio.gather(*warm_ups, return_exceptions=True)
+        for model, result in zip(models, results):
+            if isinstance(result, Exception):
+                logger.warning("Could not preload model %s: %s", model, result)
 
     def _init_classification_examples(self):
         """Initialize example queries for embedding-based classification."""
@@ -236,59 +941,94 @@ class SQLAgent:
         self._precompute_embeddings()
     
     def _precompute_embeddings(self):
-        # Pre-compute embeddings for examples
-        self.example_embeddings = {}
-        if self.rag_tool:
-            try:
-                from langchain_community.embeddings import OllamaEmbeddings
-                embeddings = OllamaEmbeddings(
-                    model=self.rag_tool.embedding_model,
-                    base_url=self.ollama_base_url
-                )
-                
-                for category, examples in self.classification_examples.items():
-                    self.example_embeddings[category] = embeddings.embed_documents(examples)
-                    logger.info(f"Pre-computed {len(examples)} embeddings for {category}")
-            except Exception as e:
-                logger.warning(f"Could not pre-compute embeddings: {e}")
-                self.example_embeddings = {}
-        else:
+        """
+        Pre-compute embeddings for the classification examples.
+        All examples are embedded in a single pooled /api/embed call and the result is cached on disk,
+        keyed by embedding model and example texts, so warm starts skip the Ollama round-trip.
+        """
+        self._emb_matrix = None
+        self._emb_slices = {}
+        if not self.rag_tool:
             logger.warning("RAG tool not available, cannot pre-compute embeddings for classification")
+            return
+        
+        model = self.rag_tool.embedding_model
+        texts = []
+        slices = {}
+        for category, examples in self.classification_examples.items():
+            slices[category] = slice(len(texts), len(texts) + len(examples))
+            texts.extend(examples)
+        
+        key_source = "\0".join([model, self._embedder.embed_instruction] + texts)
+        key = hashlib.sha256(key_source.encode("utf-8")).hexdigest()[:16]
+        cache_path = EMBEDDINGS_CACHE_DIR / f"embeddings_{key}.npy"
+        
+        try:
+            if cache_path.exists():
+                vectors = np.load(cache_path).astype(np.float32, copy=False)
+                logger.info("Loaded %s example embeddings from %s", len(texts), cache_path)
+            else:
+                vectors = np.asarray(self._embedder.embed_documents(texts), dtype=np.float32)
+                try:
+                    EMBEDDINGS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                    np.save(cache_path, vectors)
+                except OSError as e:
+                    logger.warning("Could not cache example embeddings to disk: %s", e)
+            
+            # Stack all examples into one contiguous, unit-normalised float32 matrix so classification is a single mat-vec
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            self._emb_matrix = vectors / np.where(norms == 0, 1, norms)
+            self._emb_slices = slices
+            for category, examples in self.classification_examples.items():
+                logger.info("Pre-computed %s embeddings for %s", len(examples), category)
+        except Exception as e:
+            logger.warning("Could not pre-compute embeddings: %s", e)
+            self._emb_matrix = None
+            self._emb_slices = {}
     
-    def _build_graph(self) -> Graph:
+    @classmethod
+    def _get_compiled_graph(cls, classifier_node: str) -> CompiledStateGraph:
+        """Return the compiled LangGraph workflow for the classifier node, building it on first use."""
+        with _GRAPH_CACHE_LOCK:
+            if classifier_node not in _GRAPH_CACHE:
+                _GRAPH_CACHE[classifier_node] = cls._build_graph(classifier_node)
+            return _GRAPH_CACHE[classifier_node]
+    
+    @staticmethod
+    def _build_graph(classifier_node: str) -> CompiledStateGraph:
         """Build the LangGraph workflow."""
         workflow = StateGraph(AgentState)
         
         # Choose classifier based on configuration
-        classifier_func = self._classify_query_embeddings if self.use_embeddings_classifier else self._classify_query
+        classifier_func = _agent_node(classifier_node)
         
         # Add nodes
         workflow.add_node("classify_query", classifier_func)
-        workflow.add_node("generate_sql", self._generate_sql)
-        workflow.add_node("execute_sql", self._execute_sql)
-        workflow.add_node("retrieve_documents", self._retrieve_documents)
-        workflow.add_node("format_response", self._format_response)
-        workflow.add_node("handle_error", self._handle_error)
+        workflow.add_node("generate_sql", _agent_node("_generate_sql"))
+        workflow.add_node("execute_sql", _agent_node("_execute_sql"))
+        workflow.add_node("retrieve_documents", _agent_node("_retrieve_documents"))
+        workflow.add_node("run_hybrid", _agent_node("_run_hybrid"))
+        workflow.add_node("format_response", _agent_node("_format_response"))
+        workflow.add_node("handle_error", _agent_node("_handle_error"))
         
         # Set entry point directly to classification
         workflow.set_entry_point("classify_query")
         
-        # Add edges (removed edge from understand_query)
         # Conditional routing based on query type
         workflow.add_conditional_edges(
             "classify_query",
-            self._route_query,
+            _agent_node("_route_query"),
             {
                 "sql": "generate_sql",
                 "rag": "retrieve_documents",
-                "hybrid": "generate_sql",  # For hybrid, do SQL first
+                "hybrid": "run_hybrid",  # SQL and RAG run concurrently
                 "error": "handle_error"
             }
         )
         
         workflow.add_conditional_edges(
             "generate_sql",
-            self._check_sql_generation,
+            _agent_node("_check_sql_generation"),
             {
                 "execute": "execute_sql",
                 "error": "handle_error"
@@ -296,10 +1036,17 @@ class SQLAgent:
         )
         workflow.add_conditional_edges(
             "execute_sql",
-            self._check_sql_execution,
+            _agent_node("_check_sql_execution"),
+            {
+                "format": "format_response",
+                "error": "handle_error"
+            }
+        )
+        workflow.add_conditional_edges(
+            "run_hybrid",
+            _agent_node("_check_sql_execution"),
             {
                 "format": "format_response",
-                "rag": "retrieve_documents",  # For hybrid queries
                 "error": "handle_error"
             }
         )
@@ -310,629 +1057,729 @@ class SQLAgent:
         return workflow.compile()
     
     # ----------------- QUERY CLASSIFICATION -----------------
-    def _classify_query(self, state: AgentState) -> AgentState:
+    async def _classify_query(self, state: AgentState) -> AgentState:
         """
         Node: Classify query as SQL, RAG, or HYBRID using LLM.
         """
-        query = state['user_query']
-        logger.info(f"Classifying query with LLM: {query}")
+        query = state.user_query
+        logger.info("Classifying query with LLM: %s", query)
         
         # If RAG is not available, default to SQL
         if not self.rag_tool:
-            state['query_type'] = 'SQL'
+            state.query_type = 'SQL'
             logger.info("RAG not available, routing to SQL")
             return state
         
+        query_type = self._prefilter_classification(query)
+        if query_type:
+            state.query_type = query_type
+            logger.info("Query classified as: %s (keyword prefilter)", query_type)
+            return state
+        
         # Use LLM to classify the query - format depends on provider
-        if self.model_provider == "groq":
-            # Simpler format for chat models
-            classification_prompt = dedent(f"""
-                Classify this query as SQL, RAG, or HYBRID.
-                
-                SQL - wants NAME/NUMBER/RANK only, no description:
-                "Most active user?" → SQL
-                "Película más vista" → SQL
-                "Top 10" → SQL
-                
-                RAG - asks about SPECIFIC named content:
-                "What is Aventuras Galácticas about?" → RAG
-                "De qué trata Terror Nocturno?" → RAG
-                
-                HYBRID - wants content ranking AND description:
-                "De qué trata la película más vista?" → HYBRID
-                "What is the most viewed series about?" → HYBRID
-                
-                Query: "{query}"
-                
-                Answer with ONLY one word: SQL, RAG, or HYBRID
-            """).strip()
-        else:
-            # Format for Ollama models with special tokens
-            classification_prompt = dedent(f"""
-                <|system|>
-                Classify queries: SQL, RAG, or HYBRID.
-                
-                SQL - wants NAME/NUMBER/RANK only, no description:
-                "Most active user?" → SQL
-                "Película más vista" → SQL
-                "Top 10" → SQL
-                "Which is most viewed?" → SQL
-                
-                RAG - asks about SPECIFIC named content:
-                "What is Aventuras Galácticas about?" → RAG
-                "De qué trata Terror Nocturno?" → RAG
-                
-                HYBRID - wants content ranking AND description (must have "content/" + "trata/about/describe"):
-                "De qué trata la película más vista?" → HYBRID
-                "What is the most viewed series about?" → HYBRID
-                "Tell me about the top rated película" → HYBRID
-                
-                Rules:
-                - NO "trata/about/describe" = SQL (even with "más/most")
-                - HYBRID only for content with description request
-                - Users/series/episodes asking for description = SQL (not in RAG)
-                <|end|>
-                <|user|>
-                Query: "{query}"
-                <|end|>
-                <|assistant|>
-                Classification:""").strip()
+        # (simpler format for Groq chat models, special tokens for Ollama models)
+        template = GROQ_CLASSIFICATION_PROMPT if self.model_provider == "groq" else OLLAMA_CLASSIFICATION_PROMPT
+        classification_prompt = template.format(query=query)
+        
+        model_name = self.groq_classifier_model if self.model_provider == "groq" else self.classifier_model
+        cached = self._classification_cache.get(model_name, classification_prompt)
+        if cached:
+            state.query_type = cached
+            logger.info("Query classified as: %s (cached)", cached)
+            return state
         
         try:
             # Use the pre-initialized classifier LLM
-            response = self.classifier_llm.invoke(classification_prompt)
+            response = await self._llm_calls.ainvoke(self.classifier_llm, classification_prompt)
             
-            # Handle both string responses and ChatGroq message objects
-            if hasattr(response, 'content'):
-                response = response.content.strip().upper()
-            else:
-                response = response.strip().upper()
+            query_type = self._parse_classification(response)
+            self._classification_cache.put(model_name, classification_prompt, query_type)
             
-            # Extract the classification (handle cases where LLM adds extra text)
-            if 'HYBRID' in response:
-                query_type = 'HYBRID'
-            elif 'RAG' in response:
-                query_type = 'RAG'
-            elif 'SQL' in response:
-                query_type = 'SQL'
-            else:
-                # Default to SQL if classification is unclear
-                logger.warning(f"Unclear classification response: {response}, defaulting to SQL")
-                query_type = 'SQL'
-            
-            state['query_type'] = query_type
-            logger.info(f"Query classified as: {query_type}")
+            state.query_type = query_type
+            logger.info("Query classified as: %s", query_type)
             
         except Exception as e:
-            logger.error(f"Error in query classification: {e}, defaulting to SQL")
-            state['query_type'] = 'SQL'
+            logger.error("Error in query classification: %s, defaulting to SQL", e)
+            state.query_type = 'SQL'
         
         return state
     
-    def _classify_query_embeddings(self, state: AgentState) -> AgentState:
+    def _parse_classification(self, response: str) -> str:
+        """
+        Extract the query type from the classifier output.
+        Expects a {"c": "SQL|RAG|HYBRID"} JSON object, falling back to a substring match
+        when the model returns anything else.
+        """
+        try:
+            label = str(json.loads(response).get("c", "")).strip().upper()
+            if label in ("SQL", "RAG", "HYBRID"):
+                return label
+        except (ValueError, AttributeError):
+            pass
+        
+        # Extract the classification (handle cases where LLM adds extra text)
+        response = response.strip().upper()
+        if 'HYBRID' in response:
+            return 'HYBRID'
+        elif 'RAG' in response:
+            return 'RAG'
+        elif 'SQL' in response:
+            return 'SQL'
+        
+        # Default to SQL if classification is unclear
+        logger.warning("Unclear classification response: %s, defaulting to SQL", response)
+        return 'SQL'
+    
+    def _build_title_pattern(self) -> Optional[re.Pattern]:
+        """Compile the RAG document titles into one pattern, matched against accent-folded queries."""
+        if not self.rag_tool:
+            return None
+        try:
+            titles = {_fold_accents(title) for title in self.rag_tool.get_titles()} - {""}
+        except Exception as e:
+            logger.warning("Could not load document titles for the prefilter: %s", e)
+            return None
+        if not titles:
+            return None
+        # Longest first, so a title is not shadowed by a shorter one it starts with
+        alternatives = "|".join(re.escape(title) for title in sorted(titles, key=len, reverse=True))
+        return re.compile(rf"\b(?:{alternatives})\b")
+    
+    def _mentions_known_title(self, query: str) -> bool:
+        """Check whether the query names one of the documents in the RAG store."""
+        return self._known_title_re is not None and self._known_title_re.search(_fold_accents(query)) is not None
+    
+    def _prefilter_classification(self, query: str) -> Optional[str]:
+        """
+        Classify the query from keyword cues alone when they are unambiguous.
+        Returns SQL, RAG or HYBRID, or None when the embeddings/LLM classifier has to decide.
+        """
+        if DESCRIPTION_CUE_RE.search(query):
+            # Description request: with a ranking it is HYBRID, about a single named title it is RAG
+            if RANKING_CUE_RE.search(query):
+                return None if NON_CONTENT_ENTITY_RE.search(query) else 'HYBRID'
+            if AGGREGATION_CUE_RE.search(query) or NON_CONTENT_ENTITY_RE.search(query) or CONTENT_LIST_RE.search(query):
+                return None
+            return 'RAG'
+        
+        # No description requested: rankings and aggregations are SQL
+        if RANKING_CUE_RE.search(query) or AGGREGATION_CUE_RE.search(query):
+            return 'SQL'
+        
+        # Content or a known title without a decisive cue: the classifier decides
+        if CONTENT_MENTION_RE.search(query) or self._mentions_known_title(query):
+            return None
+        
+        # Nothing about content or a title (e.g. users, plans, subscriptions): only the database can answer
+        if NON_CONTENT_ENTITY_RE.search(query) or not TITLE_SPAN_RE.search(query):
+            return 'SQL'
+        return None
+    
+    async def _classify_query_embeddings(self, state: AgentState) -> AgentState:
         """
         Alternative classification method using embedding similarity.
         This is kept as a backup/experimental approach.
         To use this, replace the call in the graph from _classify_query to this method.
+        Ambiguous matches (top two categories within EMBEDDINGS_MIN_MARGIN) are resolved by the LLM classifier.
         """
-        query = state['user_query']
-        logger.info(f"Classifying query with embeddings: {query}")
+        query = state.user_query
+        logger.info("Classifying query with embeddings: %s", query)
         
         # If RAG is not available, default to SQL
-        if not self.rag_tool or not self.example_embeddings:
-            state['query_type'] = 'SQL'
-            logger.info("RAG not available or embeddings not initialized, routing to SQL")
+        if not self.rag_tool:
+            state.query_type = 'SQL'
+            logger.info("RAG not available, routing to SQL")
+            return state
+        
+        query_type = self._prefilter_classification(query)
+        if query_type:
+            state.query_type = query_type
+            logger.info("Query classified as: %s (keyword prefilter)", query_type)
+            return state
+        
+        # Wait for the background pre-computation of the example embeddings
+        if self._emb_ready is not None:
+            await asyncio.wrap_future(self._emb_ready)
+        
+        if self._emb_matrix is None:
+            state.query_type = 'SQL'
+            logger.info("Embeddings not initialized, routing to SQL")
             return state
         
         try:
             # Get embedding for the input query
-            from langchain_community.embeddings import OllamaEmbeddings
-            embeddings = OllamaEmbeddings(
-                model=self.rag_tool.embedding_model,
-                base_url=self.ollama_base_url
-            )
+            query_embedding = await self._embed_user_query(state)
             
-            query_embedding = embeddings.embed_query(query)
+            # Cosine similarity against every example at once (rows are already unit-normalised)
+            query_vector = np.asarray(query_embedding, dtype=np.float32)
+            query_norm = np.linalg.norm(query_vector)
+            if query_norm == 0:
+                raise ValueError("Query embedding has zero magnitude")
+            similarities = self._emb_matrix @ (query_vector / query_norm)
             
-            # Calculate similarity scores for each category
-            category_scores = {}
+            # Use max similarity as the category score
+            categories = list(self._emb_slices)
+            scores = np.array([similarities[self._emb_slices[c]].max() for c in categories])
+            category_scores = dict(zip(categories, scores.tolist()))
             
-            for category, example_embeddings in self.example_embeddings.items():
-                # Calculate similarity with each example
-                similarities = [
-                    self._cosine_similarity(query_embedding, example_emb)
-                    for example_emb in example_embeddings
-                ]
-                
-                # Use max similarity as the category score
-                max_similarity = max(similarities) if similarities else 0.0
-                category_scores[category] = max_similarity
-                
-                logger.info(f"{category}: max_similarity={max_similarity:.4f}")
-            
-            # Select category with highest score
-            best_category = max(category_scores, key=category_scores.get)
-            best_score = category_scores[best_category]
+            # Only the two best categories matter for the decision
+            top2 = np.argpartition(scores, -2)[-2:]
+            best, runner_up = (top2[1], top2[0]) if scores[top2[1]] >= scores[top2[0]] else (top2[0], top2[1])
+            best_category = categories[best]
+            best_score = float(scores[best])
+            margin = best_score - float(scores[runner_up])
             
             # Log detailed scores
-            logger.info(f"Similarity scores: {category_scores}")
-            logger.info(f"Best match: {best_category} (score: {best_score:.4f})")
+            logger.debug("Similarity scores: %s", category_scores)
+            logger.info("Best match: %s (score: %.4f, margin: %.4f)", best_category, best_score, margin)
+            
+            if margin < EMBEDDINGS_MIN_MARGIN:
+                logger.info("Ambiguous embedding match, falling back to LLM classifier")
+                return await self._classify_query(state)
             
-            state['query_type'] = best_category
+            state.query_type = best_category
             
         except Exception as e:
-            logger.error(f"Error in embedding-based classification: {e}, defaulting to SQL")
-            import traceback
-            traceback.print_exc()
-            state['query_type'] = 'SQL'
+            logger.error("Error in embedding-based classification: %s, defaulting to SQL", e, exc_info=True)
+            state.query_type = 'SQL'
         
         return state
     
-    def _cosine_similarity(self, vec1, vec2):
-        """Calculate cosine similarity between two vectors."""
-        import math
-        dot_product = sum(a * b for a, b in zip(vec1, vec2))
-        magnitude1 = math.sqrt(sum(a * a for a in vec1))
-        magnitude2 = math.sqrt(sum(b * b for b in vec2))
+    async def _classify_and_generate_sql(self, state: AgentState) -> AgentState:
+        """
+        Node: Classify the query and generate its SQL with a single LLM call (CLASSIFIER_TYPE=fused).
+        Queries resolved by the keyword prefilter, or without RAG, get their SQL from _generate_sql as usual.
+        """
+        query = state.user_query
+        logger.info("Classifying query and generating SQL with one LLM call: %s", query)
+        
+        # If RAG is not available, default to SQL
+        if not self.rag_tool:
+            state.query_type = 'SQL'
+            logger.info("RAG not available, routing to SQL")
+            return state
         
-        if magnitude1 == 0 or magnitude2 == 0:
-            return 0.0
+        query_type = self._prefilter_classification(query)
+        if query_type:
+            state.query_type = query_type
+            logger.info("Query classified as: %s (keyword prefilter)", query_type)
+            return state
+        
+        # The query type is not known yet and HYBRID queries need the content table, so the schema is not slimmed
+        schema = await self._aget_schema()
+        prompt = self._render_sql_prompt(FUSED_CLASSIFICATION_SQL_PROMPT, "", query.strip(), schema, "SQL")
+        model_name = self.groq_sql_model if self.model_provider == "groq" else self.sql_model
+        
+        try:
+            response = self._classification_cache.get(model_name, prompt)
+            if response is None:
+                response = await self._llm_calls.ainvoke(self.fused_llm, prompt)
+            
+            logger.debug("Raw fused response: %s", response)
+            try:
+                parsed = json.loads(response)
+            except json.JSONDecodeError:
+                parsed = {}
+            
+            query_type = str(parsed.get("query_type") or "").strip().upper()
+            if query_type not in ('SQL', 'RAG', 'HYBRID'):
+                query_type = self._parse_classification(response)
+            
+            sql_query = ""
+            if query_type != 'RAG' and isinstance(parsed.get("sql_query"), str):
+                sql_query = self._clean_sql_response(parsed["sql_query"])
+            
+            self._classification_cache.put(model_name, prompt, response)
+            state.query_type = query_type
+            state.sql_query = sql_query
+            logger.info("Query classified as: %s, SQL: %s", query_type, sql_query or '(none)')
+            
+        except Exception as e:
+            logger.error("Error in fused classification: %s, defaulting to SQL", e)
+            state.query_type = 'SQL'
         
-        return dot_product / (magnitude1 * magnitude2)
+        return state
     
     def _route_query(self, state: AgentState) -> str:
         """Conditional edge: Route based on query classification."""
-        query_type = state.get('query_type', 'SQL')
-        
-        if query_type == 'SQL':
-            return 'sql'
-        elif query_type == 'RAG':
-            return 'rag'
-        elif query_type == 'HYBRID':
-            return 'hybrid'
-        else:
-            return 'error'
+        return QUERY_TYPE_ROUTES.get(state.query_type, "error")
     
-    def _generate_sql(self, state: AgentState) -> AgentState:
+    async def _generate_sql(self, state: AgentState) -> AgentState:
         """
         Node: Generate SQL query from natural language.
         """
         logger.info("Generating SQL query")
         
+        # Already generated together with the classification (fused classifier)
+        if state.sql_query:
+            logger.info("Using SQL from fused classification: %s", state.sql_query)
+            return state
+        
         # Get database schema
-        schema = self.sql_tool.get_database_schema()
-        logger.info(f"Retrieved schema: {len(schema)} characters")
+        schema = await self._aget_schema()
+        logger.info("Retrieved schema: %s characters", len(schema))
         
         # Process user query - clean and prepare it
-        user_query = state['user_query'].strip()
-        query_type = state.get('query_type', 'SQL')
-        logger.info(f"Processing query: {user_query} (type: {query_type})")
+        user_query = state.user_query.strip()
+        query_type = state.query_type
+        logger.info("Processing query: %s (type: %s)", user_query, query_type)
         
-        # Detect model type and create appropriate prompt
-        if self.model_provider == "groq":
-            # Groq uses chat models, use a clean format
-            system_prompt = self._create_phi3_prompt(user_query, schema, query_type)
-        elif 'phi3' in self.sql_model.lower():
-            # Phi3 uses a specific prompt template with special tokens
-            system_prompt = self._create_phi3_prompt(user_query, schema, query_type)
-        elif 'sqlcoder' in self.sql_model.lower():
-            # SQLCoder uses ### Instructions format
-            system_prompt = self._create_sqlcoder_prompt(user_query, schema, query_type)
-        else:
-            # Default prompt for other models
-            system_prompt = self._create_default_prompt(user_query, schema, query_type)
+        # HYBRID prompts rely on the content table for titles, so they keep the full schema
+        if self.slim_schema and query_type == "SQL":
+            schema = self._slim_schema(user_query, schema)
+        
+        # Prompt in the format of the configured model
+        system_prompt = self._create_sql_prompt(user_query, schema, query_type)
+        
+        model_name = self.groq_sql_model if self.model_provider == "groq" else self.sql_model
+        cached = self._sql_cache.get(model_name, system_prompt)
+        if cached:
+            state.sql_query = cached
+            logger.info("Cached SQL: %s", cached)
+            return state
         
         try:
             # Generate SQL using the SQL-specialized model
-            model_name = self.groq_sql_model if self.model_provider == "groq" else self.sql_model
-            logger.info(f"Calling SQL model: {model_name}")
-            sql_query = self.sql_llm.invoke(system_prompt)
-            
-            # Handle both string responses and ChatGroq message objects
-            if hasattr(sql_query, 'content'):
-                sql_query = sql_query.content
-            else:
-                sql_query = str(sql_query)
+            logger.info("Calling SQL model: %s", model_name)
+            # Streamed, and stopped once the statement is complete instead of waiting for trailing commentary
+            sql_query = await self._llm_calls.ainvoke(self.sql_llm, system_prompt, until=_sql_response_complete)
             
-            logger.info(f"Raw SQL response: {sql_query}")
+            logger.debug("Raw SQL response: %s", sql_query)
             
             # Clean up the response
             sql_query = self._clean_sql_response(sql_query)
             
-            state["sql_query"] = sql_query
-            logger.info(f"Cleaned SQL: {sql_query}")
+            state.sql_query = sql_query
+            logger.info("Cleaned SQL: %s", sql_query)
             
             if not sql_query:
                 error_msg = "SQL model returned empty response"
                 logger.error(error_msg)
-                state["error"] = error_msg
+                state.error = error_msg
+            else:
+                self._sql_cache.put(model_name, system_prompt, sql_query)
             
         except Exception as e:
             error_msg = f"Error generating SQL: {str(e)}"
             logger.error(error_msg, exc_info=True)
-            state["error"] = error_msg
+            state.error = error_msg
         
         return state
     
-    def _create_phi3_prompt(self, user_query: str, schema: str, query_type: str = "SQL") -> str:
-        """Create prompt for Phi3 model using its specific template."""
+    async def _aget_schema(self, ttl: Optional[float] = None) -> str:
+        """
+        Async _get_schema(). An expired schema keeps being served while a single background refresh
+        fetches it again, so queries only wait for the database when no schema has been fetched yet
+        (and then share one fetch, started by aquery() while the query is being classified).
+        """
+        ttl = self.schema_cache_ttl if ttl is None else ttl
+        if self._schema_cache is None:
+            return await asyncio.shield(self._refresh_schema(ttl))
         
-        # Add special instruction for HYBRID queries
-        hybrid_instruction = ""
-        if query_type == "HYBRID":
-            hybrid_instruction = "\n            - CRITICAL: ALWAYS include c.titulo (content title) in SELECT for ranking queries"
+        if time.monotonic() - self._schema_cache_ts >= ttl:
+            self._refresh_schema(ttl)
+        return self._schema_cache
+    
+    def _refresh_schema(self, ttl: Optional[float] = None) -> asyncio.Task:
+        """Start fetching the schema in a worker thread, or return the fetch already in flight."""
+        if self._schema_refresh is None:
+            self._schema_refresh = asyncio.create_task(asyncio.to_thread(self._get_schema, ttl))
+            self._schema_refresh.add_done_callback(self._schema_refreshed)
+        return self._schema_refresh
+    
+    def _schema_refreshed(self, task: asyncio.Task):
+        """Done callback of the background schema refresh."""
+        self._schema_refresh = None
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Background schema refresh failed: %s", task.exception())
+    
+    def _get_schema(self, ttl: Optional[float] = None) -> str:
+        """
+        Return the database schema, fetching it again only when the cached copy is older than ttl seconds
+        (default: the agent's schema_cache_ttl). If a refresh fails, the previously cached schema keeps being used.
+        """
+        ttl = self.schema_cache_ttl if ttl is None else ttl
+        if self._schema_cache is not None and time.monotonic() - self._schema_cache_ts < ttl:
+            return self._schema_cache
         
-        # For Groq (chat models), use a simpler format
-        if self.model_provider == "groq":
-            return dedent(f"""
-                You are a PostgreSQL expert. Generate ONLY a valid PostgreSQL query.
-                
-                Question: {user_query}
-                
-                Database Schema:
-                {schema}
-                
-                Rules:
-                - Use proper table and column names from the schema
-                - Every non-aggregated column in SELECT must be in GROUP BY
-                - Use COUNT(*) for counting, SUM() for totals, AVG() for averages
-                - For "top N" or "most X" queries: use ORDER BY with LIMIT{hybrid_instruction}
-                - Use proper JOIN syntax with foreign key relationships
-                - Generate ONLY the SQL query, no explanations or markdown
-                
-                SQL Query:
-            """).strip()
+        schema = self.sql_tool.get_database_schema(refresh=self._schema_cache is not None)
         
-        # For Ollama Phi3, use the specific template with tokens
-        return dedent(f"""
-            <|system|>
-            You are a PostgreSQL expert. Your task is to generate ONLY a valid PostgreSQL query.
-            
-            Rules:
-            - Use proper table and column names from the schema
-            - Every non-aggregated column in SELECT must be in GROUP BY
-            - Use COUNT(*) for counting, SUM() for totals, AVG() for averages
-            - For "top N" or "most X" queries: use ORDER BY with LIMIT{hybrid_instruction}
-            - Use proper JOIN syntax with foreign key relationships
-            - Generate ONLY the SQL query, no explanations or markdown
-            <|end|>
-            <|user|>
-            Question: {user_query}
-            
-            Database Schema:
-            {schema}
-            
-            Generate a PostgreSQL query to answer the question. Output ONLY the SQL query:
-            <|end|>
-            <|assistant|>
-            SELECT
-        """).strip()
+        # SQLTool only caches successfully retrieved schemas
+        if self.sql_tool.schema_cache is not None:
+            self._schema_cache = schema
+            self._schema_cache_ts = time.monotonic()
+        elif self._schema_cache is not None:
+            logger.warning("Schema refresh failed, using previously cached schema")
+            return self._schema_cache
+        
+        return schema
+    
+    def _slim_schema(self, user_query: str, schema: str) -> str:
+        """
+        Cut the schema down to the tables the query names and the tables they join with, which shortens
+        the SQL prompt (and its prefill). Falls back to the full schema when no table name matches.
+        The same table set always returns the same string, so slimmed prompts stay cacheable.
+        """
+        index = self._schema_index
+        if index is None or index[0] is not schema:
+            tables = SQLTool.split_schema(schema)
+            links = {name: {name} for name in tables}
+            for table, ref_table in SCHEMA_FOREIGN_KEY_RE.findall(schema):
+                if table in links and ref_table in links:
+                    links[table].add(ref_table)
+                    links[ref_table].add(table)
+            index = self._schema_index = (schema, tables, links, {})
+        _, tables, links, slimmed = index
+        
+        stems = {
+            word[:SCHEMA_MATCH_STEM]
+            for word in re.findall(r"\w+", _fold_accents(user_query))
+            if len(word) >= SCHEMA_MATCH_MIN_WORD
+        }
+        matched = [name for name in tables if any(stem in name.lower() for stem in stems)]
+        if not matched:
+            return schema
+        
+        selected = frozenset().union(*(links[name] for name in matched))
+        if len(selected) == len(tables):
+            return schema
+        if selected not in slimmed:
+            slimmed[selected] = "\n".join(block for name, block in tables.items() if name in selected)
+            logger.debug("Slimmed schema to %s", sorted(selected))
+        return slimmed[selected]
+    
+    def _create_phi3_prompt(self, user_query: str, schema: str, query_type: str = "SQL") -> str:
+        """Create prompt for Phi3 model using its specific template."""
+        # For Groq (chat models), use a simpler format
+        template = GROQ_SQL_PROMPT if self.model_provider == "groq" else PHI3_SQL_PROMPT
+        return self._render_sql_prompt(template, PHI3_HYBRID_INSTRUCTION, user_query, schema, query_type)
     
     def _create_sqlcoder_prompt(self, user_query: str, schema: str, query_type: str = "SQL") -> str:
         """Create prompt for SQLCoder model using its recommended format."""
-        
-        # Add special instruction for HYBRID queries
-        hybrid_instruction = ""
-        if query_type == "HYBRID":
-            hybrid_instruction = "\n            - **CRITICAL for ranking queries**: ALWAYS include c.titulo (content title) in SELECT clause"
-        
-        return dedent(f"""
-            ### Instructions:
-            Your task is to convert a question into a SQL query, given a PostgreSQL database schema.
-            Adhere to these rules:
-            - **Deliberately go through the question and database schema word by word** to appropriately answer the question
-            - **Use Table Aliases** to prevent ambiguity. For example, `SELECT table1.col1, table2.col1 FROM table1 JOIN table2 ON table1.id = table2.id`
-            - When creating a ratio, always cast the numerator as float
-            - **CRITICAL PostgreSQL GROUP BY rule**: Every non-aggregated column in SELECT must appear in GROUP BY
-              * If you SELECT c.titulo, c.id_contenido and use COUNT(*), you must GROUP BY c.titulo, c.id_contenido
-              * If you SELECT c.titulo and use COUNT(*), you must GROUP BY c.titulo
-            - Prefer simple queries over complex window functions when possible
-            - For "most viewed" or "most popular" queries, use COUNT(*), GROUP BY, ORDER BY, and LIMIT{hybrid_instruction}
-            - Use COUNT(*) for counting rows, SUM() for totals, AVG() for averages
-            - Generate ONLY valid PostgreSQL syntax
-            - Do NOT include explanations, comments, or additional text after the SQL query
-            
-            ### Input:
-            Generate a SQL query that answers the question `{user_query}`.
-            This query will run on a PostgreSQL database whose schema is represented below:
-            {schema}
-            
-            ### Response:
-            Based on your instructions, here is the SQL query I have generated to answer the question `{user_query}`:
-            ```sql
-        """).strip()
+        return self._render_sql_prompt(SQLCODER_SQL_PROMPT, SQLCODER_HYBRID_INSTRUCTION, user_query, schema, query_type)
     
     def _create_default_prompt(self, user_query: str, schema: str, query_type: str = "SQL") -> str:
         """Create default prompt for general models."""
-        
-        # Add special instruction for HYBRID queries
-        hybrid_instruction = ""
-        if query_type == "HYBRID":
-            hybrid_instruction = "\n            - CRITICAL: Include c.titulo (content title) in SELECT for ranking queries"
-        
-        return dedent(f"""
-            You are a PostgreSQL expert. Generate ONLY a valid SQL query.
-            
-            Question: {user_query}
-            
-            Database Schema:
-            {schema}
-            
-            Generate a PostgreSQL query. Rules:
-            - Every non-aggregated column in SELECT must be in GROUP BY
-            - Use COUNT(*), SUM(), AVG() for aggregations
-            - Use ORDER BY with LIMIT for "top N" queries{hybrid_instruction}
-            - Output ONLY the SQL query, no explanations
-            
-            SQL Query:
-        """).strip()
+        return self._render_sql_prompt(DEFAULT_SQL_PROMPT, DEFAULT_HYBRID_INSTRUCTION, user_query, schema, query_type)
     
-    def _clean_sql_response(self, sql_query: str) -> str:
-        """Clean up SQL response from various model outputs."""
-        sql_query = sql_query.strip()
-        
-        # Remove markdown code blocks if present
-        if "```sql" in sql_query:
-            # Extract SQL from code block
-            start = sql_query.find("```sql") + 6
-            end = sql_query.find("```", start)
-            if end != -1:
-                sql_query = sql_query[start:end]
-        elif "```" in sql_query:
-            # Remove any ``` markers
-            sql_query = sql_query.replace("```sql", "").replace("```", "")
-        
-        sql_query = sql_query.strip()
-        
-        # Remove trailing semicolon if present
-        while sql_query.endswith(";"):
-            sql_query = sql_query[:-1].strip()
-        
-        # Remove any trailing newlines or whitespace
-        sql_query = " ".join(sql_query.split())
-        
-        # Sometimes models add explanatory text - try to extract just the SELECT statement
-        if "\n\n" in sql_query or ". " in sql_query:
-            # Look for SELECT statement
-            lines = sql_query.split("\n")
-            for i, line in enumerate(lines):
-                if line.strip().upper().startswith("SELECT"):
-                    # Take from SELECT to the end or until we hit explanatory text
-                    sql_query = " ".join(lines[i:])
-                    break
-        
-        # Remove phi3-specific artifacts
-        if sql_query.startswith("SELECT"):
-            # Already starts with SELECT, good
-            pass
+    def _render_sql_prompt(self, template: str, hybrid_instruction: str, user_query: str, schema: str,
+                           query_type: str) -> str:
+        """
+        Fill an SQL (or fused classification + SQL) prompt template. The schema and hybrid instruction
+        are substituted once per schema version and the result is split around the question, so each
+        query only joins its question into the pre-rendered pieces (no placeholder scan over the whole prompt).
+        """
+        hybrid = query_type == "HYBRID"
+        key = (template, schema, hybrid)
+        pieces = self._sql_prompt_prefixes.get(key)
+        if pieces is None:
+            pieces = template.format(
+                user_query="\0",
+                schema=schema,
+                hybrid_instruction=hybrid_instruction if hybrid else ""
+            ).split("\0")
+            self._sql_prompt_prefixes[key] = pieces
+            if len(self._sql_prompt_prefixes) > SQL_PROMPT_PREFIX_CACHE_SIZE:
+                self._sql_prompt_prefixes.popitem(last=False)
         else:
-            # Try to find SELECT in the response
-            select_pos = sql_query.upper().find("SELECT")
-            if select_pos != -1:
-                sql_query = sql_query[select_pos:]
+            self._sql_prompt_prefixes.move_to_end(key)
+        return user_query.join(pieces)
+    
+    def _clean_sql_response(self, sql_query: str) -> str:
+        """
+        Clean up SQL response from various model outputs.
+        Handles markdown code blocks, explanatory text around the query and trailing semicolons
+        in a single regex scan and a single trim. Newlines inside the query are kept; whitespace
+        is collapsed later, once, by SQLTool when the statement is parameterized.
+        """
+        match = SQL_RESPONSE_RE.search(sql_query)
+        if match:
+            sql_query = match.group(1) if match.group(1) is not None else match.group(2)
         
-        return sql_query
+        return sql_query.strip("; \t\r\n")
     
-    def _execute_sql(self, state: AgentState) -> AgentState:
+    async def _execute_sql(self, state: AgentState) -> AgentState:
         """
         Node: Execute the generated SQL query.
         """
         logger.info("Executing SQL query")
         
         try:
-            results = self.sql_tool.execute_query(state["sql_query"])
+            results = await asyncio.to_thread(self.sql_tool.execute_query, state.sql_query)
             
-            # Convert rows to list of dictionaries for easier access
-            if results["success"] and results.get("columns") and results.get("rows"):
-                columns = results["columns"]
-                rows = results["rows"]
-                
-                # Convert to list of dicts
-                results["results"] = [
-                    dict(zip(columns, row)) for row in rows
-                ]
-                logger.info(f"Converted {len(results['results'])} rows to dictionary format")
-            else:
-                results["results"] = []
-            
-            state["sql_results"] = results
+            state.sql_results = results
             
             if not results["success"]:
-                state["error"] = results["error"]
+                state.error = results["error"]
                 
         except Exception as e:
             error_msg = f"Error executing SQL: {str(e)}"
             logger.error(error_msg)
-            state["error"] = error_msg
+            state.error = error_msg
         
         return state
     
-    def _format_response(self, state: AgentState) -> AgentState:
+    async def _format_response(self, state: AgentState) -> AgentState:
         """
         Node: Format the results (SQL and/or RAG) into a natural language response.
         """
         logger.info("Formatting response")
         
         try:
-            query_type = state.get('query_type', 'SQL')
+            query_type = state.query_type
+            
+            direct_answer = self._direct_sql_answer(state) if self.direct_sql_answers else None
+            if direct_answer is not None:
+                logger.info("Answering small SQL result directly, skipping the conversation LLM")
+                state.formatted_response = direct_answer
+                sink = _response_sink.get()
+                if sink is not None:
+                    sink(direct_answer)
+                return state
+            
+            full_context = self._build_response_context(state)
+            
+            # Generate response based on query type (RAG-only, or SQL/HYBRID summary)
+            template = RAG_RESPONSE_PROMPT if query_type == 'RAG' else SUMMARY_RESPONSE_PROMPT
+            prompt = template.format(user_query=state.user_query, full_context=full_context)
             
-            # Build context based on available data
+            sink = _response_sink.get()
+            if sink is None:
+                conversation_response = await self._llm_calls.ainvoke(self.conversation_llm, prompt)
+            else:
+                # Streaming caller: forward each chunk as soon as the model produces it
+                chunks = []
+                async for text in self._llm_calls.astream(self.conversation_llm, prompt):
+                    chunks.append(text)
+                    sink(text)
+                conversation_response = "".join(chunks)
+            
+            state.formatted_response = conversation_response.strip()
+            
+        except Exception as e:
+            error_msg = f"Error formatting response: {str(e)}"
+            logger.error(error_msg)
+            state.error = error_msg
+        
+        return state
+    
+    def _build_response_context(self, state: AgentState) -> str:
+        """
+        Build the SQL and/or RAG context for the response prompt within MAX_RESPONSE_CONTEXT_CHARS.
+        Prompt size dominates the conversation model's latency, so an oversized context is cut down
+        step by step: only the top SQL rows are kept, then document previews are shortened, and
+        finally HYBRID answers keep only the most relevant document.
+        """
+        sql_results = state.sql_results if state.sql_results.get("success") else None
+        
+        def build(max_rows: Optional[int] = None, preview_chars: int = RAG_PREVIEW_CHARS,
+                  max_docs: Optional[int] = None) -> str:
             context_parts = []
             
             # Add SQL context if available
-            if state.get("sql_results") and state["sql_results"].get("success"):
-                formatted_results = self.sql_tool.format_results(state["sql_results"])
-                context_parts.append(f"""
-                SQL Query executed:
-                {state.get('sql_query', 'N/A')}
-                
-                Results:
-                {formatted_results}
-                """)
+            if sql_results:
+                results = sql_results
+                if max_rows is not None and results["row_count"] > max_rows:
+                    results = {**results, "rows": results["rows"][:max_rows], "row_count": max_rows, "truncated": True}
+                context_parts.append(SQL_CONTEXT_TEMPLATE.format(
+                    sql_query=state.sql_query or 'N/A',
+                    formatted_results=self.sql_tool.format_results(results)
+                ))
             
             # Add RAG context if available
-            if state.get("retrieved_docs"):
-                docs = state["retrieved_docs"]
-                rag_info = state.get("rag_results", {})
-                metadatas = rag_info.get("metadatas", [])
-                similarities = rag_info.get("similarities", [])
+            if state.retrieved_docs:
+                metadatas = state.rag_results.get("metadatas", [])
+                similarities = state.rag_results.get("similarities", [])
                 
-                rag_context = "Content Information from PDFs:\n"
-                for i, (doc, meta, sim) in enumerate(zip(docs, metadatas, similarities), 1):
+                rag_parts = ["Content Information from PDFs:\n"]
+                docs = list(zip(state.retrieved_docs, metadatas, similarities))[:max_docs]
+                for i, (doc, meta, sim) in enumerate(docs, 1):
                     title = meta.get('title', 'Unknown') if meta else 'Unknown'
                     # Truncate long documents
-                    doc_preview = doc[:500] + "..." if len(doc) > 500 else doc
-                    rag_context += f"\n[{i}] {title} (relevance: {sim:.2f}):\n{doc_preview}\n"
+                    doc_preview = f"{doc[:preview_chars]}..." if len(doc) > preview_chars else doc
+                    rag_parts.append(f"\n[{i}] {title} (relevance: {sim:.2f}):\n{doc_preview}\n")
                 
-                context_parts.append(rag_context)
-            
-            # Create the full context
-            full_context = "\n\n".join(context_parts)
+                context_parts.append("".join(rag_parts))
             
-            # Generate response based on query type
-            if query_type == 'RAG':
-                # RAG-only response
-                prompt = dedent(f"""
-                    You are a helpful AI assistant for a streaming platform.
-                    
-                    The user asked: "{state['user_query']}"
-                    
-                    {full_context}
-                    
-                    Provide a clear, informative answer based on the content information above.
-                    Be concise but include key details about the content.
-                    
-                    Response:
-                """).strip()
-            else:
-                # SQL or HYBRID response
-                prompt = dedent(f"""
-                    You are a helpful AI assistant for a streaming platform.
-    
-                    The user asked: "{state['user_query']}"
-    
-                    {full_context}
-    
-                    Provide a brief, friendly summary combining the information above.
-                    Be concise but informative. If there are many results, highlight the most relevant ones.
+            return "\n\n".join(context_parts)
+        
+        full_context = build()
+        if len(full_context) > MAX_RESPONSE_CONTEXT_CHARS:
+            full_context = build(max_rows=CONTEXT_TOP_ROWS)
+        if len(full_context) > MAX_RESPONSE_CONTEXT_CHARS:
+            full_context = build(max_rows=CONTEXT_TOP_ROWS, preview_chars=RAG_SHORT_PREVIEW_CHARS)
+        if len(full_context) > MAX_RESPONSE_CONTEXT_CHARS and state.query_type == 'HYBRID':
+            full_context = build(max_rows=CONTEXT_TOP_ROWS, preview_chars=RAG_SHORT_PREVIEW_CHARS, max_docs=1)
+        
+        logger.debug("Response context: %d chars", len(full_context))
+        return full_context
     
-                    Response:
-                """).strip()
-            
-            conversation_response = self.conversation_llm.invoke(prompt)
-            
-            # Handle both string responses and ChatGroq message objects
-            if hasattr(conversation_response, 'content'):
-                conversation_response = conversation_response.content
-            else:
-                conversation_response = str(conversation_response)
-            
-            state["formatted_response"] = conversation_response.strip()
-            
-        except Exception as e:
-            error_msg = f"Error formatting response: {str(e)}"
-            logger.error(error_msg)
-            state["error"] = error_msg
+    @staticmethod
+    def _direct_sql_answer(state: AgentState) -> Optional[str]:
+        """
+        Template the answer of a pure SQL query with a tiny or empty result (e.g. a single count).
         
-        return state
+        Returns:
+            The answer text, or None if the result needs the conversation LLM
+        """
+        results = state.sql_results
+        if state.query_type != 'SQL' or not results.get("success") or results.get("truncated"):
+            return None
+        
+        columns, rows = results["columns"], results["rows"]
+        if not rows:
+            return DIRECT_ANSWER_NO_ROWS
+        if len(rows) > DIRECT_ANSWER_MAX_ROWS or not 0 < len(columns) <= DIRECT_ANSWER_MAX_COLUMNS:
+            return None
+        if not all(cell is None or isinstance(cell, DIRECT_ANSWER_CELL_TYPES) for row in rows for cell in row):
+            return None
+        
+        return "\n".join(
+            ", ".join(f"{col}: {'N/A' if val is None else val}" for col, val in zip(columns, row))
+            for row in rows
+        )
     
-    def _handle_error(self, state: AgentState) -> AgentState:
+    async def _handle_error(self, state: AgentState) -> AgentState:
         """
         Node: Handle errors gracefully.
         """
         logger.info("Handling error")
         
-        error_message = state.get("error", "Unknown error occurred")
+        error_message = state.error or "Unknown error occurred"
         
-        state["formatted_response"] = dedent(f"""
-            I encountered an error while processing your request:
-
-            ❌ {error_message}
-
-            Please try rephrasing your question or ask something else.
-        """).strip()
+        state.formatted_response = ERROR_RESPONSE_TEMPLATE.format(error_message=error_message)
+        
+        sink = _response_sink.get()
+        if sink is not None:
+            sink(state.formatted_response)
         
         return state
     
     def _check_sql_generation(self, state: AgentState) -> str:
         """Conditional edge: Check if SQL generation was successful."""
-        if state.get("error"):
-            return "error"
-        if state.get("sql_query"):
-            return "execute"
-        return "error"
+        return "execute" if state.sql_query and not state.error else "error"
     
     def _check_sql_execution(self, state: AgentState) -> str:
         """Conditional edge: Check if SQL execution was successful."""
-        if state.get("error"):
-            return "error"
-        if state.get("sql_results") and state["sql_results"].get("success"):
-            # Check if this is a hybrid query that needs RAG
-            if state.get("query_type") == "HYBRID":
-                return "rag"
-            return "format"
-        return "error"
-    
-    def _retrieve_documents(self, state: AgentState) -> AgentState:
+        return "format" if not state.error and state.sql_results.get("success") else "error"
+    
+    async def _retrieve_documents(self, state: AgentState) -> AgentState:
         """
         Node: Retrieve relevant documents using RAG.
-        For HYBRID queries: extracts content titles from SQL results and retrieves their PDFs.
-        For RAG queries: does semantic search based on user query.
+        Does semantic search based on the user query (RAG-only queries).
         """
         logger.info("Retrieving documents via RAG")
         
         if not self.rag_tool:
             error_msg = "RAG functionality not available"
             logger.error(error_msg)
-            state["error"] = error_msg
+            state.error = error_msg
+            return state
+        
+        rag_results = await self._search_documents(state)
+        self._apply_rag_results(state, rag_results)
+        
+        return state
+    
+    async def _run_hybrid(self, state: AgentState) -> AgentState:
+        """
+        Node: Run the SQL pipeline and the RAG semantic search concurrently for HYBRID queries.
+        Once SQL finishes, content titles are extracted from its results and their PDFs are
+        retrieved; the semantic search results are used only as a fallback when no titles are found,
+        otherwise the search is cancelled without waiting for it. When the SQL is already known to
+        select titles (fused classifier), the search is not started up front at all.
+        """
+        logger.info("HYBRID query detected - running SQL and RAG concurrently")
+        
+        if not self.rag_tool:
+            await self._generate_sql(state)
+            if not state.error:
+                await self._execute_sql(state)
+            logger.warning("RAG not available, continuing with SQL only")
+            state.retrieved_docs = []
+            return state
+        
+        search_task = None
+        if not SELECTS_TITLE_RE.match(state.sql_query):
+            search_task = asyncio.create_task(self._search_documents(state))
+        
+        await self._generate_sql(state)
+        if not state.error:
+            await self._execute_sql(state)
+        
+        if state.error:
+            if search_task is not None:
+                search_task.cancel()
             return state
         
         try:
-            query_type = state.get("query_type")
+            titles = self._extract_titles_from_sql_results(state)
             
-            # For HYBRID queries, extract titles from SQL results
-            if query_type == "HYBRID":
-                logger.info("HYBRID query detected - extracting content titles from SQL results")
-                titles = self._extract_titles_from_sql_results(state)
-                
-                if not titles:
-                    logger.warning("No titles found in SQL results, falling back to semantic search")
-                    rag_results = self.rag_tool.search(state['user_query'], top_k=3)
-                else:
-                    logger.info(f"Found {len(titles)} titles in SQL results: {titles}")
-                    rag_results = self._retrieve_documents_by_titles(titles)
+            if not titles:
+                logger.warning("No titles found in SQL results, falling back to semantic search")
+                rag_results = await (search_task or self._search_documents(state))
             else:
-                # For RAG-only queries, use semantic search
-                rag_results = self.rag_tool.search(state['user_query'], top_k=3)
+                logger.info("Found %d titles in SQL results: %s", len(titles), titles)
+                rag_results = await self._retrieve_documents_by_titles(titles)
             
-            state["rag_results"] = rag_results
+            self._apply_rag_results(state, rag_results)
             
-            if rag_results["success"]:
-                state["retrieved_docs"] = rag_results["documents"]
-                logger.info(f"Retrieved {len(rag_results['documents'])} documents")
-            else:
-                # RAG failed - check if it was RAG-only query
-                if state.get("query_type") == "RAG":
-                    # For RAG-only queries, this is an error
-                    state["error"] = rag_results.get("error", "Failed to retrieve documents")
-                else:
-                    # For hybrid queries, continue without RAG
-                    logger.warning("RAG retrieval failed, continuing without RAG context")
-                    state["retrieved_docs"] = []
-                    
         except Exception as e:
-            error_msg = f"Error retrieving documents: {str(e)}"
-            logger.error(error_msg, exc_info=True)
-            
-            # Only fail for RAG-only queries
-            if state.get("query_type") == "RAG":
-                state["error"] = error_msg
-            else:
-                logger.warning("RAG failed for hybrid query, continuing with SQL only")
-                state["retrieved_docs"] = []
+            logger.exception("Error retrieving documents: %s", e)
+            logger.warning("RAG failed for hybrid query, continuing with SQL only")
+            state.retrieved_docs = []
+        finally:
+            if search_task is not None:
+                search_task.cancel()
         
         return state
     
+    async def _embed_user_query(self, state: AgentState) -> list:
+        """
+        Return the embedding of the user query, computing it only the first time it is needed.
+        Repeated questions (ignoring case and whitespace) reuse their embedding from an LRU cache.
+        """
+        if state.query_embedding is None:
+            key = _normalize_query(state.user_query)
+            embedding = self._query_embedding_cache.get(self._embedder.model, key)
+            if embedding is None:
+                embedding = await self._embedder.aembed_query(state.user_query)
+                self._query_embedding_cache.put(self._embedder.model, key, embedding)
+            state.query_embedding = embedding
+        return state.query_embedding
+    
+    async def _search_documents(self, state: AgentState) -> dict:
+        """Run a semantic search, returning a failed result instead of raising."""
+        try:
+            query_embedding = await self._embed_user_query(state)
+            return await self.rag_tool.asearch(state.user_query, top_k=3, query_embedding=query_embedding)
+        except Exception as e:
+            error_msg = f"Error retrieving documents: {str(e)}"
+            logger.exception(error_msg)
+            return {
+                "success": False,
+                "error": error_msg,
+                "documents": [],
+                "metadatas": [],
+                "similarities": [],
+                "count": 0
+            }
+    
+    def _apply_rag_results(self, state: AgentState, rag_results: dict):
+        """Store RAG results in the state. Failures are errors only for RAG-only queries."""
+        state.rag_results = rag_results
+        
+        if rag_results["success"]:
+            state.retrieved_docs = rag_results["documents"]
+            logger.info("Retrieved %d documents", len(rag_results["documents"]))
+        elif state.query_type == "RAG":
+            # For RAG-only queries, this is an error
+            state.error = rag_results.get("error", "Failed to retrieve documents")
+        else:
+            # For hybrid queries, continue without RAG
+            logger.warning("RAG retrieval failed, continuing without RAG context")
+            state.retrieved_docs = []
+    
     def _extract_titles_from_sql_results(self, state: AgentState) -> list:
         """
         Extract content titles from SQL query results.
@@ -942,35 +1789,32 @@ class SQLAgent:
             state: Current agent state with SQL results
             
         Returns:
-            List of content titles
+            List of unique content titles, in result order
         """
         titles = []
         
         try:
-            sql_results = state.get("sql_results", {})
+            sql_results = state.sql_results
             if not sql_results.get("success"):
                 return titles
             
-            results = sql_results.get("results", [])
-            if not results:
+            # Check if 'titulo' column exists in results
+            columns = sql_results.get("columns", [])
+            if 'titulo' not in columns:
                 return titles
             
-            # Check if 'titulo' column exists in results
-            for row in results:
-                if isinstance(row, dict) and 'titulo' in row:
-                    title = row['titulo']
-                    if title:
-                        titles.append(str(title))
-                        logger.debug(f"Extracted title: {title}")
+            # dict.fromkeys drops repeated titles (e.g. one row per view) while keeping their order
+            title_index = columns.index('titulo')
+            titles = list(dict.fromkeys(str(row[title_index]) for row in sql_results.get("rows", []) if row[title_index]))
             
-            logger.info(f"Extracted {len(titles)} titles from SQL results")
+            logger.info("Extracted %d titles from SQL results", len(titles))
             
         except Exception as e:
-            logger.error(f"Error extracting titles from SQL results: {e}", exc_info=True)
+            logger.exception("Error extracting titles from SQL results: %s", e)
         
         return titles
     
-    def _retrieve_documents_by_titles(self, titles: list) -> dict:
+    async def _retrieve_documents_by_titles(self, titles: list) -> dict:
         """
         Retrieve documents from RAG by specific content titles.
         
@@ -978,38 +1822,41 @@ class SQLAgent:
             titles: List of content titles to retrieve
             
         Returns:
-            Dictionary with success status, documents, and metadata (same format as rag_tool.search)
+            Dictionary with success status, documents, and metadata (same format as rag_tool.search).
+            Documents follow the order of titles (titles without a match are skipped), so callers
+            never need to re-sort them.
         """
         all_documents = []
         all_metadatas = []
         all_similarities = []
         
+        # Exact matches for all titles in one lookup
+        found = await asyncio.to_thread(self.rag_tool.get_documents_by_titles, titles)
+        
+        # If exact match fails, match the title against the embedded document titles,
+        # then semantic search (all missing titles in one batch)
+        missing = [title for title in titles if title not in found]
+        searched = {}
+        if missing:
+            logger.warning("Exact match failed for %s, trying title similarity", missing)
+            searched = dict(zip(missing, await self.rag_tool.asearch_titles(missing)))
+        
         for title in titles:
-            try:
-                # Try exact match first
-                result = self.rag_tool.get_document_by_title(title)
-                
-                if result["success"]:
-                    all_documents.append(result["document"])
-                    all_metadatas.append(result.get("metadata", {"title": title}))
-                    all_similarities.append(1.0)  # Exact match = 100% similarity
-                    logger.info(f"Found exact match for title: {title}")
-                else:
-                    # If exact match fails, try semantic search with the title
-                    logger.warning(f"Exact match failed for '{title}', trying semantic search")
-                    search_result = self.rag_tool.search(title, top_k=1)
-                    
-                    if search_result["success"] and search_result["documents"]:
-                        all_documents.extend(search_result["documents"])
-                        all_metadatas.extend(search_result["metadatas"])
-                        all_similarities.extend(search_result["similarities"])
-                        logger.info(f"Found semantic match for title: {title}")
-                    else:
-                        logger.warning(f"No match found for title: {title}")
-                        
-            except Exception as e:
-                logger.error(f"Error retrieving document for title '{title}': {e}", exc_info=True)
+            if title in found:
+                all_documents.append(found[title]["document"])
+                all_metadatas.append(found[title]["metadata"] or {"title": title})
+                all_similarities.append(1.0)  # Exact match = 100% similarity
+                logger.info("Found exact match for title: %s", title)
                 continue
+            
+            search_result = searched[title]
+            if search_result["success"] and search_result["documents"]:
+                all_documents.extend(search_result["documents"])
+                all_metadatas.extend(search_result["metadatas"])
+                all_similarities.extend(search_result["similarities"])
+                logger.info("Found semantic match for title: %s", title)
+            else:
+                logger.warning("No match found for title: %s", title)
         
         if all_documents:
             return {
@@ -1029,9 +1876,9 @@ class SQLAgent:
                 "count": 0
             }
     
-    def query(self, user_query: str) -> dict:
+    async def aquery(self, user_query: str) -> dict:
         """
-        Process a user query through the agent graph.
+        Process a user query through the agent graph asynchronously.
         
         Args:
             user_query: Natural language query from user
@@ -1039,28 +1886,157 @@ class SQLAgent:
         Returns:
             Dictionary with response and metadata
         """
-        logger.info(f"Processing user query: {user_query}")
-        
-        # Initialize state
-        initial_state = {
-            "user_query": user_query,
-            "query_type": "",
-            "sql_query": "",
-            "sql_results": {},
-            "rag_results": {},
-            "retrieved_docs": [],
-            "formatted_response": "",
-            "error": ""
-        }
+        logger.info("Processing user query: %s", user_query)
+        
+        state = AgentState(user_query=user_query)
+        
+        # Answer exact repeats, then near-duplicate queries, from the response caches
+        query_key = _normalize_query(user_query)
+        if self._result_cache is not None:
+            cached = self._result_cache.get("result", query_key)
+            if cached is not None and time.monotonic() - cached[0] <= SEMANTIC_CACHE_TTL:
+                logger.info("Result cache hit")
+                return self._cached_result(copy.deepcopy(cached[1]), "exact")
         
-        # Run the graph
-        final_state = self.graph.invoke(initial_state)
+        query_embedding = None
+        if self._response_cache is not None:
+            try:
+                query_embedding = await self._embed_user_query(state)
+                cached = self._response_cache.get(query_embedding, user_query)
+                if cached is not None:
+                    return self._cached_result(cached, "semantic")
+            except Exception as e:
+                logger.warning("Semantic cache lookup failed: %s", e)
         
-        return {
-            "response": final_state.get("formatted_response", ""),
-            "query_type": final_state.get("query_type", ""),
-            "sql_query": final_state.get("sql_query", ""),
-            "results": final_state.get("sql_results", {}),
-            "rag_results": final_state.get("rag_results", {}),
-            "error": final_state.get("error", "")
+        # No schema yet (startup prefetch failed): fetch it while the query is classified
+        if self._schema_cache is None:
+            self._refresh_schema()
+        
+        # Run the graph, with its nodes bound to this agent
+        token = _current_agent.set(self)
+        try:
+            final_state = AgentState(**await self.graph.ainvoke(
+                {name: getattr(state, name) for name in AGENT_STATE_FIELDS}
+            ))
+        finally:
+            _current_agent.reset(token)
+        
+        result = {
+            "response": final_state.formatted_response,
+            "query_type": final_state.query_type,
+            "sql_query": final_state.sql_query,
+            "results": final_state.sql_results,
+            "rag_results": final_state.rag_results,
+            "error": final_state.error,
+            "cache_hit": False,
+            "cache_kind": None
         }
+        
+        if not result["error"]:
+            if self._result_cache is not None:
+                self._result_cache.put("result", query_key, (time.monotonic(), copy.deepcopy(result)))
+            if query_embedding is not None:
+                self._response_cache.put(query_embedding, user_query, result)
+        
+        return result
+    
+    @staticmethod
+    def _cached_result(result: dict, cache_kind: str) -> dict:
+        """
+        Mark a result served from a response cache, sending its response to the streaming sink if any.
+        
+        Args:
+            result: Cached result dictionary
+            cache_kind: "exact" for a repeated query, "semantic" for a similar one
+            
+        Returns:
+            The result, with cache_hit and cache_kind set
+        """
+        sink = _response_sink.get()
+        if sink is not None:
+            sink(result["response"])
+        result["cache_hit"] = True
+        result["cache_kind"] = cache_kind
+        return result
+    
+    async def astream_query(self, user_query: str) -> AsyncIterator[str]:
+        """
+        Process a user query through the agent graph, streaming the response text.
+        Classification, SQL and RAG steps run as in aquery(); the final response is yielded
+        chunk by chunk while the conversation model generates it.
+        
+        Args:
+            user_query: Natural language query from user
+            
+        Yields:
+            Chunks of the formatted response
+        """
+        chunks = asyncio.Queue()
+        done = object()
+        
+        # The graph task inherits the sink from the current context when it is created
+        token = _response_sink.set(chunks.put_nowait)
+        try:
+            task = asyncio.ensure_future(self.aquery(user_query))
+        finally:
+            _response_sink.reset(token)
+        task.add_done_callback(lambda _: chunks.put_nowait(done))
+        
+        try:
+            while (chunk := await chunks.get()) is not done:
+                yield chunk
+            await task
+        finally:
+            task.cancel()
+    
+    def query(self, user_query: str, on_chunk: Optional[Callable[[str], None]] = None) -> dict:
+        """
+        Process a user query through the agent graph.
+        Synchronous wrapper around aquery() for the CLI and Streamlit callers.
+        
+        Args:
+            user_query: Natural language query from user
+            on_chunk: Optional callback receiving the response text chunk by chunk while it is
+                generated (called from the agent's event loop thread)
+            
+        Returns:
+            Dictionary with response and metadata
+        """
+        return self.submit_query(user_query, on_chunk).result()
+    
+    def submit_query(self, user_query: str, on_chunk: Optional[Callable[[str], None]] = None) -> Future:
+        """
+        Start processing a user query on the agent's event loop without waiting for it.
+        Lets synchronous callers (e.g. Streamlit) render streamed chunks while the query runs.
+        
+        Args:
+            user_query: Natural language query from user
+            on_chunk: Optional callback receiving the response text chunk by chunk while it is
+                generated (called from the agent's event loop thread)
+            
+        Returns:
+            Future resolving to the same dictionary query() returns
+        """
+        coro = self.aquery(user_query) if on_chunk is None else self._aquery_with_sink(user_query, on_chunk)
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+    
+    async def _aquery_with_sink(self, user_query: str, sink: Callable[[str], None]) -> dict:
+        """Run aquery() with response chunks sent to sink (the task has its own context copy)."""
+        _response_sink.set(sink)
+        return await self.aquery(user_query)
+    
+    async def aclose(self):
+        """Close the pooled Ollama and Groq async HTTP connections of the running event loop."""
+        await ollama_client.aclose()
+        if self._groq_async_client is not None:
+            await self._groq_async_client.close()
+    
+    def close(self):
+        """Close pooled HTTP and database connections and stop the background event loop."""
+        if self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self.aclose(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        ollama_client.close()
+        if self._groq_client is not None:
+            self._groq_client.close()
+        self.sql_tool.close()
@@ -0,0 +1,45 @@
+"""
+Thread-safe LRU caches shared by the agent and its tools.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Maximum number of entries kept by each prompt-level LLM output cache
+PROMPT_CACHE_SIZE = 2048
+
+
+class PromptCache:
+    """
+    Thread-safe LRU cache of LLM outputs keyed by (model, sha256(prompt)); also holds query embeddings.
+    Prompts embed the database schema, so a schema change naturally produces new keys.
+    The agent and its RAG tool share one instance for query embeddings.
+    """
+    
+    def __init__(self, maxsize: int = PROMPT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _key(model: str, prompt: str) -> tuple:
+        return model, hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    
+    def get(self, model: str, prompt: str):
+        """Return the cached output for the prompt, or None."""
+        key = self._key(model, prompt)
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+    
+    def put(self, model: str, prompt: str, value: str):
+        """Store an output, evicting the least recently used entry when full."""
+        key = self._key(model, prompt)
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
@@ -0,0 +1,135 @@
+"""
+Agent configuration loaded from the environment.
+
+The environment is read, parsed and validated once at startup; a missing or malformed
+required value fails there with a clear message instead of deep inside the agent.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+REQUIRED_DB_VARS = ("DB_HOST", "DB_PORT", "DB_NAME", "DB_USER")
+
+
+def _bool_env(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _float_env(name: str, default: str) -> float:
+    value = os.getenv(name, default)
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number, got {value!r}") from None
+
+
+@dataclass(frozen=True)
+class Config:
+    """Frozen agent settings (see .env.example for the matching environment variables)."""
+
+    # Database
+    db_host: str
+    db_port: int
+    db_name: str
+    db_user: str
+    db_password: Optional[str] = None
+
+    # Model provider: 'ollama' or 'groq'
+    model_provider: str = "ollama"
+
+    # Ollama
+    ollama_base_url: str = "http://localhost:11434"
+    sql_model: str = "llama3.2:7b"
+    conversation_model: str = "llama3.2:7b"
+    classifier_model: str = "phi3:mini"
+    ollama_keep_alive: str = "30m"
+
+    # Groq
+    groq_api_key: Optional[str] = None
+    groq_sql_model: str = "llama-3.1-8b-instant"
+    groq_conversation_model: str = "llama-3.1-8b-instant"
+    groq_classifier_model: str = "llama-3.1-8b-instant"
+
+    # Classifier: 'llm', 'embeddings' or 'fused'
+    classifier_type: str = "llm"
+
+    # Seconds the database schema is reused before it is fetched again
+    schema_cache_ttl: float = 300.0
+
+    # Whether near-duplicate questions are answered from the semantic response cache (may return the
+    # answer to a similar but different question, e.g. "most" vs "least" viewed)
+    semantic_cache: bool = False
+
+    # Whether SQL prompts only include the tables a query names (and the tables they join with)
+    slim_schema: bool = False
+
+    # RAG (enabled only when summaries_dir exists)
+    summaries_dir: Optional[str] = None
+    embedding_model: str = "nomic-embed-text"
+    chroma_db_dir: str = "./chroma_db"
+
+    @classmethod
+    def from_env(cls) -> "Config":
+        """
+        Build the configuration from environment variables (call load_dotenv() first).
+
+        Raises:
+            ValueError: If a required database variable is missing or a numeric value is malformed
+        """
+        missing = [name for name in REQUIRED_DB_VARS if not os.getenv(name)]
+        if missing:
+            raise ValueError(f"Missing required environment variables: {', '.join(missing)}")
+
+        db_port = os.getenv("DB_PORT")
+        try:
+            db_port = int(db_port)
+        except ValueError:
+            raise ValueError(f"DB_PORT must be an integer, got {db_port!r}") from None
+
+        return cls(
+            db_host=os.getenv("DB_HOST"),
+            db_port=db_port,
+            db_name=os.getenv("DB_NAME"),
+            db_user=os.getenv("DB_USER"),
+            db_password=os.getenv("DB_PASSWORD"),
+            model_provider=os.getenv("MODEL_PROVIDER", "ollama").lower(),
+            ollama_base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
+            sql_model=os.getenv("SQL_MODEL", "llama3.2:7b"),
+            conversation_model=os.getenv("CONVERSATION_MODEL", "llama3.2:7b"),
+            classifier_model=os.getenv("CLASSIFIER_MODEL", "phi3:mini"),
+            ollama_keep_alive=os.getenv("OLLAMA_KEEP_ALIVE", cls.ollama_keep_alive),
+            groq_api_key=os.getenv("GROQ_API_KEY"),
+            groq_sql_model=os.getenv("GROQ_SQL_MODEL", "llama-3.1-8b-instant"),
+            groq_conversation_model=os.getenv("GROQ_CONVERSATION_MODEL", "llama-3.1-8b-instant"),
+            groq_classifier_model=os.getenv("GROQ_CLASSIFIER_MODEL", "llama-3.1-8b-instant"),
+            classifier_type=os.getenv("CLASSIFIER_TYPE", "llm").lower(),
+            schema_cache_ttl=_float_env("SCHEMA_CACHE_TTL", str(cls.schema_cache_ttl)),
+            semantic_cache=_bool_env("SEMANTIC_CACHE", "false"),
+            slim_schema=_bool_env("SLIM_SCHEMA", "false"),
+            summaries_dir=os.getenv("SUMMARIES_DIR"),
+            embedding_model=os.getenv("EMBEDDING_MODEL", "nomic-embed-text"),
+            chroma_db_dir=os.getenv("CHROMA_DB_DIR", "./chroma_db")
+        )
+
+    @property
+    def db_config(self) -> dict:
+        """Connection parameters in the form SQLTool expects."""
+        return {
+            "host": self.db_host,
+            "port": self.db_port,
+            "database": self.db_name,
+            "user": self.db_user,
+            "password": self.db_password
+        }
+
+    @property
+    def rag_config(self) -> Optional[dict]:
+        """RAGTool settings, or None when the summaries directory is not available."""
+        if not self.summaries_dir or not os.path.exists(self.summaries_dir):
+            return None
+        return {
+            "summaries_dir": self.summaries_dir,
+            "embedding_model": self.embedding_model,
+            "chroma_db_dir": self.chroma_db_dir
+        }
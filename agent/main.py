@@ -3,12 +3,12 @@
 CLI interface for the SQL AI Agent.
 """
 
-import os
 import sys
 import logging
 from textwrap import dedent
 from dotenv import load_dotenv
 from agent import SQLAgent
+from config import Config
 
 # Load environment variables
 load_dotenv()
@@ -17,69 +17,79 @@ load_dotenv()
 LOG_LEVEL = "INFO"
 LOG_FILE = "agent.log"
 
-logging.basicConfig(
-    level=getattr(logging, LOG_LEVEL),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
-
 logger = logging.getLogger(__name__)
 
 
-def print_banner():
-    """Print welcome banner."""
-    banner = dedent("""
-        ╔══════════════════════════════════════════════════════════════╗
-        ║                                                              ║
-        ║          🎬 Streaming Platform SQL AI Agent 🤖              ║
-        ║                                                              ║
-        ║  Ask questions about users, content, ratings, and more!     ║
-        ║  I'll translate your questions into SQL and fetch results.  ║
-        ║                                                              ║
-        ╚══════════════════════════════════════════════════════════════╝
+# Static CLI texts, dedented once at import
+BANNER = dedent("""
+    ╔══════════════════════════════════════════════════════════════╗
+    ║                                                              ║
+    ║          🎬 Streaming Platform SQL AI Agent 🤖              ║
+    ║                                                              ║
+    ║  Ask questions about users, content, ratings, and more!     ║
+    ║  I'll translate your questions into SQL and fetch results.  ║
+    ║                                                              ║
+    ╚══════════════════════════════════════════════════════════════╝
 
-        Type 'quit', 'exit', or 'q' to exit.
-        Type 'help' for example questions.
+    Type 'quit', 'exit', or 'q' to exit.
+    Type 'help' for example questions.
 
-    """)
-    print(banner)
+""")
 
+HELP_TEXT = dedent("""
+    📚 EXAMPLE QUESTIONS:
 
-def print_help():
-    """Print help information with example queries."""
-    help_text = dedent("""
-        📚 EXAMPLE QUESTIONS:
+    General Queries:
+      • ¿Cuántos usuarios tenemos registrados?
+      • Muestra los 10 contenidos más populares
+      • ¿Qué géneros de contenido tenemos disponibles?
+
+    User Analytics:
+      • ¿Cuáles son los usuarios más activos?
+      • Usuarios que se registraron en el último mes
+      • ¿Cuántos usuarios hay por país?
 
-        General Queries:
-          • ¿Cuántos usuarios tenemos registrados?
-          • Muestra los 10 contenidos más populares
-          • ¿Qué géneros de contenido tenemos disponibles?
+    Content Analytics:
+      • Películas mejor calificadas
+      • Series con más visualizaciones
+      • Contenido agregado este año
+
+    Ratings & Views:
+      • Promedio de rating por género
+      • Contenido con más de 100 visualizaciones
+      • Usuarios que nunca han calificado contenido
+
+    Actor Information:
+      • Actores con más participaciones
+      • Actores nacidos en Argentina
+      • Contenido protagonizado por [nombre del actor]
+
+""")
+
+
+def print_banner():
+    """Print welcome banner."""
+    print(BANNER)
 
-        User Analytics:
-          • ¿Cuáles son los usuarios más activos?
-          • Usuarios que se registraron en el último mes
-          • ¿Cuántos usuarios hay por país?
 
-        Content Analytics:
-          • Películas mejor calificadas
-          • Series con más visualizaciones
-          • Contenido agregado este año
+def print_help():
+    """Print help information with example queries."""
+    print(HELP_TEXT)
 
-        Ratings & Views:
-          • Promedio de rating por género
-          • Contenido con más de 100 visualizaciones
-          • Usuarios que nunca han calificado contenido
 
-        Actor Information:
-          • Actores con más participaciones
-          • Actores nacidos en Argentina
-          • Contenido protagonizado por [nombre del actor]
+def setup_logging():
+    """Log to LOG_FILE and stdout, unless logging was already configured by the importer."""
+    if logging.getLogger().handlers:
+        return
+    logging.basicConfig(
+        level=getattr(logging, LOG_LEVEL),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(LOG_FILE),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
 
-    """)
-    print(help_text)
 
 def print_divisor():
     print("\n" + "="*70)
@@ -89,74 +99,33 @@ def main():
     """Main CLI loop."""
     print_banner()
     
-    # Load database configuration from environment
-    db_config = {
-        "host": os.getenv("DB_HOST"),
-        "port": int(os.getenv("DB_PORT")),
-        "database": os.getenv("DB_NAME"),
-        "user": os.getenv("DB_USER"),
-        "password": os.getenv("DB_PASSWORD")
-    }
-    
-    # Load model provider configuration
-    model_provider = os.getenv("MODEL_PROVIDER", "ollama").lower()
-    
-    # Load Ollama configuration
-    ollama_base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
-    sql_model = os.getenv("SQL_MODEL", "llama3.2:7b")
-    conversation_model = os.getenv("CONVERSATION_MODEL", "llama3.2:7b")
-    classifier_model = os.getenv("CLASSIFIER_MODEL", "phi3:mini")
-    
-    # Load Groq configuration
-    groq_api_key = os.getenv("GROQ_API_KEY")
-    groq_sql_model = os.getenv("GROQ_SQL_MODEL", "llama-3.1-8b-instant")
-    groq_conversation_model = os.getenv("GROQ_CONVERSATION_MODEL", "llama-3.1-8b-instant")
-    groq_classifier_model = os.getenv("GROQ_CLASSIFIER_MODEL", "llama-3.1-8b-instant")
-    
-    # Load classifier configuration
-    use_embeddings_classifier = os.getenv("CLASSIFIER_TYPE", "llm").lower() == "embeddings"
+    # Load and validate the configuration once
+    try:
+        config = Config.from_env()
+    except ValueError as e:
+        print(f"❌ Configuration error: {e}")
+        sys.exit(1)
     
-    # Load RAG configuration (optional)
-    rag_config = None
-    summaries_dir = os.getenv("SUMMARIES_DIR")
-    if summaries_dir and os.path.exists(summaries_dir):
-        rag_config = {
-            "summaries_dir": summaries_dir,
-            "embedding_model": os.getenv("EMBEDDING_MODEL", "nomic-embed-text"),
-            "chroma_db_dir": os.getenv("CHROMA_DB_DIR", "./chroma_db")
-        }
-        print(f"📚 RAG functionality enabled (summaries: {summaries_dir})")
+    if config.rag_config:
+        print(f"📚 RAG functionality enabled (summaries: {config.summaries_dir})")
     else:
         print("⚠️  RAG functionality disabled (summaries directory not found)")
     
     # Display model provider information
-    if model_provider == "groq":
-        print(f"☁️  Using Groq cloud models (SQL: {groq_sql_model})")
+    if config.model_provider == "groq":
+        print(f"☁️  Using Groq cloud models (SQL: {config.groq_sql_model})")
     else:
-        print(f"🖥️  Using local Ollama models (SQL: {sql_model})")
+        print(f"🖥️  Using local Ollama models (SQL: {config.sql_model})")
     
     try:
         # Initialize agent
         print("🔧 Initializing agent...")
-        agent = SQLAgent(
-            db_config=db_config,
-            ollama_base_url=ollama_base_url,
-            sql_model=sql_model,
-            conversation_model=conversation_model,
-            classifier_model=classifier_model,
-            rag_config=rag_config,
-            use_embeddings_classifier=use_embeddings_classifier,
-            model_provider=model_provider,
-            groq_api_key=groq_api_key,
-            groq_sql_model=groq_sql_model,
-            groq_conversation_model=groq_conversation_model,
-            groq_classifier_model=groq_classifier_model
-        )
+        agent = SQLAgent.from_config(config)
         print("✅ Agent initialized successfully!\n")
         
     except Exception as e:
         print(f"❌ Error initializing agent: {str(e)}")
-        logger.error(f"Initialization error: {str(e)}")
+        logger.error("Initialization error: %s", e)
         sys.exit(1)
     
     # Main loop
@@ -179,10 +148,21 @@ def main():
             if not user_input:
                 continue
             
-            # Process query
+            # Process query, printing the response as soon as it starts streaming
             print("\n🤔 Thinking...")
-            result = agent.query(user_input)
+            streamed = []
             
+            def print_chunk(chunk):
+                if not streamed:
+                    print_divisor()
+                    print(f"🤖 Response:\n")
+                streamed.append(chunk)
+                print(chunk, end="", flush=True)
+            
+            result = agent.query(user_input, on_chunk=print_chunk)
+            
+            if streamed:
+                print("\n")
             print_divisor()
             
             # Show query type
@@ -195,20 +175,24 @@ def main():
                 emoji = query_type_emoji.get(result["query_type"], "❓")
                 print(f"\n{emoji} Query Type: {result['query_type']}\n")
             
+            if result.get("cache_kind") == "semantic":
+                print("⚡ Answered from the semantic cache (similar recent question)\n")
+            elif result.get("cache_hit"):
+                print("⚡ Answered from the result cache (same recent question)\n")
+            
             # Show generated SQL
             if result.get("sql_query"):
                 print(f"📝 Generated SQL:\n")
                 print(f"   {result['sql_query']}\n")
             
-            # Show response
-            if result.get("response"):
+            # Show response (unless it was already streamed)
+            if result.get("response") and not streamed:
                 print(f"🤖 Response:\n")
                 print(f"{result['response']}\n")
             
             # Show raw results if available
             if result.get("results") and result["results"].get("success"):
-                from sql_tool import SQLTool
-                formatted = SQLTool(db_config).format_results(result["results"])
+                formatted = agent.sql_tool.format_results(result["results"])
                 print(f"\n📊 Query Results:\n")
                 print(formatted)
             
@@ -219,8 +203,9 @@ def main():
             break
         except Exception as e:
             print(f"\n❌ Unexpected error: {str(e)}")
-            logger.error(f"Runtime error: {str(e)}", exc_info=True)
+            logger.error("Runtime error: %s", e, exc_info=True)
 
 
 if __name__ == "__main__":
+    setup_logging()
     main()
@@ -0,0 +1,238 @@
+"""
+Pooled HTTP access to the Ollama API.
+
+All Ollama traffic (LLM generation and embeddings) goes through shared httpx clients
+so TCP connections are kept alive and reused instead of being opened per request.
+"""
+
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Any, AsyncIterator, Iterator, List, Optional
+import httpx
+import orjson
+from langchain_community.embeddings import OllamaEmbeddings
+from langchain_community.llms import Ollama
+from langchain_community.llms.ollama import OllamaEndpointNotFoundError
+
+logger = logging.getLogger(__name__)
+
+HTTP_TIMEOUT = 120
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+
+_client = None
+_client_lock = threading.Lock()
+
+# httpx.AsyncClient connections are bound to the event loop that opened them
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_client() -> httpx.Client:
+    """Return the process-wide pooled HTTP client (thread-safe)."""
+    global _client
+    with _client_lock:
+        if _client is None or _client.is_closed:
+            _client = httpx.Client(timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS)
+        return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Return the pooled async HTTP client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS)
+        _async_clients[loop] = client
+    return client
+
+
+def close():
+    """Close the pooled synchronous HTTP client."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+async def aclose():
+    """Close the pooled async HTTP client of the running event loop."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def _embed_payload(model: str, texts: list, keep_alive: Optional[str]) -> dict:
+    payload = {"model": model, "input": texts}
+    if keep_alive is not None:
+        payload["keep_alive"] = keep_alive
+    return payload
+
+
+def embed(base_url: str, model: str, texts: list, keep_alive: Optional[str] = None) -> list:
+    """
+    Embed several texts with a single call to Ollama's batch /api/embed endpoint.
+    The response (one large float array per text) is decoded with orjson, several times faster than json.
+
+    Args:
+        base_url: Base URL for Ollama API
+        model: Name of the embedding model (e.g., nomic-embed-text)
+        texts: List of texts to embed
+        keep_alive: How long Ollama keeps the model loaded after the request (server default if None)
+
+    Returns:
+        List of embeddings, in the same order as texts
+    """
+    response = get_client().post(
+        f"{base_url.rstrip('/')}/api/embed",
+        json=_embed_payload(model, texts, keep_alive)
+    )
+    response.raise_for_status()
+    embeddings = orjson.loads(response.content)["embeddings"]
+    logger.info("Embedded %s texts with %s in one request", len(texts), model)
+    return embeddings
+
+
+async def aembed(base_url: str, model: str, texts: list, keep_alive: Optional[str] = None) -> list:
+    """Async variant of embed(), sent through the pooled client of the running event loop."""
+    response = await get_async_client().post(
+        f"{base_url.rstrip('/')}/api/embed",
+        json=_embed_payload(model, texts, keep_alive)
+    )
+    response.raise_for_status()
+    embeddings = orjson.loads(response.content)["embeddings"]
+    logger.info("Embedded %s texts with %s in one request", len(texts), model)
+    return embeddings
+
+
+async def awarm_up(base_url: str, model: str, keep_alive: str) -> None:
+    """
+    Load a model into memory ahead of its first query.
+    A /api/generate request without a prompt only loads the model and keeps it resident for keep_alive.
+    """
+    response = await get_async_client().post(
+        f"{base_url.rstrip('/')}/api/generate",
+        json={"model": model, "keep_alive": keep_alive}
+    )
+    response.raise_for_status()
+    logger.info("Loaded %s (keep_alive=%s)", model, keep_alive)
+
+
+def _status_error(status_code: int, detail: str, model: str) -> Exception:
+    """Build the same exceptions LangChain's Ollama wrapper raises for failed calls."""
+    if status_code == 404:
+        return OllamaEndpointNotFoundError(
+            "Ollama call failed with status code 404. "
+            f"Maybe your model is not found and you should pull the model with `ollama pull {model}`."
+        )
+    return ValueError(f"Ollama call failed with status code {status_code}. Details: {detail}")
+
+
+class PooledOllama(Ollama):
+    """LangChain Ollama LLM that sends its requests through the pooled HTTP clients."""
+
+    def _request_payload(self, payload: Any, stop: Optional[List[str]], **kwargs: Any) -> dict:
+        """Build the /api/generate request body (same rules as the LangChain wrapper)."""
+        if self.stop is not None and stop is not None:
+            raise ValueError("`stop` found in both the input and default params.")
+        elif self.stop is not None:
+            stop = self.stop
+
+        params = self._default_params
+        for key in self._default_params:
+            if key in kwargs:
+                params[key] = kwargs[key]
+
+        if "options" in kwargs:
+            params["options"] = kwargs["options"]
+        else:
+            params["options"] = {
+                **params["options"],
+                "stop": stop,
+                **{k: v for k, v in kwargs.items() if k not in self._default_params},
+            }
+
+        if payload.get("messages"):
+            return {"messages": payload.get("messages", []), **params}
+        return {"prompt": payload.get("prompt"), "images": payload.get("images", []), **params}
+
+    def _create_stream(
+        self,
+        api_url: str,
+        payload: Any,
+        stop: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> Iterator[str]:
+        request_payload = self._request_payload(payload, stop, **kwargs)
+        with get_client().stream(
+            "POST",
+            api_url,
+            json=request_payload,
+            headers=self.headers or {},
+            timeout=self.timeout or HTTP_TIMEOUT
+        ) as response:
+            if response.status_code != 200:
+                response.read()
+                raise _status_error(response.status_code, response.text, self.model)
+            yield from response.iter_lines()
+
+    async def _acreate_stream(
+        self,
+        api_url: str,
+        payload: Any,
+        stop: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[str]:
+        request_payload = self._request_payload(payload, stop, **kwargs)
+        async with get_async_client().stream(
+            "POST",
+            api_url,
+            json=request_payload,
+            headers=self.headers or {},
+            timeout=self.timeout or HTTP_TIMEOUT
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                raise _status_error(response.status_code, response.text, self.model)
+            async for line in response.aiter_lines():
+                yield line
+
+    async def astream_text(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Stream the response text for a prompt straight from /api/generate, skipping LangChain's
+        Runnable/callback layer (config merging, callback managers, generation chunks) on every chunk.
+        """
+        async for line in self._acreate_generate_stream(prompt):
+            if line:
+                text = orjson.loads(line).get("response", "")
+                if text:
+                    yield text
+
+    async def agenerate_text(self, prompt: str) -> str:
+        """Full response text for a prompt, see astream_text()."""
+        return "".join([text async for text in self.astream_text(prompt)])
+
+
+class PooledOllamaEmbeddings(OllamaEmbeddings):
+    """LangChain Ollama embeddings that batch texts into one pooled /api/embed request."""
+
+    keep_alive: Optional[str] = None
+    """How long Ollama keeps the embedding model loaded after a request (server default if None)."""
+
+    def _embed(self, input: List[str]) -> List[List[float]]:
+        return embed(self.base_url, self.model, input, self.keep_alive)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several search queries (with the query instruction) in one request."""
+        return embed(self.base_url, self.model, [f"{self.query_instruction}{text}" for text in texts], self.keep_alive)
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Async variant of embed_queries()."""
+        return await aembed(self.base_url, self.model, [f"{self.query_instruction}{text}" for text in texts], self.keep_alive)
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await aembed(self.base_url, self.model, [f"{self.embed_instruction}{text}" for text in texts], self.keep_alive)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await aembed(self.base_url, self.model, [f"{self.query_instruction}{text}"], self.keep_alive))[0]
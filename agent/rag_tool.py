@@ -2,19 +2,65 @@
 RAG Tool for retrieving content summaries from PDF documents.
 """
 
+import asyncio
+import hashlib
 import logging
+import multiprocessing
 import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Iterator, Optional, Tuple
 import chromadb
+import numpy as np
 from langchain_community.document_loaders import PyPDFLoader
-from langchain_community.embeddings import OllamaEmbeddings
+
+from cache import PromptCache
+from ollama_client import PooledOllamaEmbeddings
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of documents kept by the title lookup cache
+TITLE_CACHE_SIZE = 1024
+
+# Maximum number of search query and title embeddings kept by the query embedding cache
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+
+# Maximum number of PDFs embedded per /api/embed request when building the vector store
+EMBED_BATCH_SIZE = 32
+
+# Maximum number of those embedding requests in flight at once
+EMBED_MAX_WORKERS = 4
+
+# Corpora with at least this many PDFs are parsed in worker processes (below it, starting them costs
+# more than parsing serially while the embedding requests run)
+PDF_PROCESS_POOL_MIN_FILES = 64
+
+# HNSW index of the summaries collection. It holds tens to a few thousand documents, so a denser graph
+# (M, construction_ef) costs little memory, and a search_ef above the collection size makes the top-k
+# search effectively exact (the default of 10 can miss neighbours). ChromaDB applies search_ef to
+# existing collections too; M and construction_ef take effect when a collection's index is first built.
+HNSW_METADATA = {"hnsw:space": "cosine", "hnsw:M": 32, "hnsw:construction_ef": 200, "hnsw:search_ef": 100}
+
+# Minimum cosine similarity between a requested title and a document title to treat them as the same content
+TITLE_MATCH_THRESHOLD = 0.8
+
+
+def _load_pdf(pdf_path: str) -> str:
+    """
+    Text of all the pages of a PDF (module level so worker processes can run it).
+    Pages are parsed one at a time, so only their text is held, not every page's Document at once.
+    """
+    loader = PyPDFLoader(pdf_path)
+    return "\n".join(page.page_content for page in loader.lazy_load())
+
 
 class RAGTool:
     """Tool for RAG (Retrieval-Augmented Generation) using ChromaDB and PDFs."""
     
-    def __init__(self, summaries_dir: str, ollama_base_url: str, embedding_model: str, chroma_db_dir: str):
+    def __init__(self, summaries_dir: str, ollama_base_url: str, embedding_model: str, chroma_db_dir: str,
+                 keep_alive: str = None, embedding_cache: Optional[PromptCache] = None):
         """
         Initialize the RAG Tool.
         
@@ -23,148 +69,431 @@ class RAGTool:
             ollama_base_url: Base URL for Ollama API
             embedding_model: Name of the embedding model (e.g., nomic-embed-text)
             chroma_db_dir: Path to ChromaDB persistent storage
+            keep_alive: How long Ollama keeps the embedding model loaded after a request (optional, server default)
+            embedding_cache: Query embedding cache to share with the caller (optional, a private one by default)
         """
         self.summaries_dir = summaries_dir
         self.embedding_model = embedding_model
         
-        logger.info(f"Initializing RAGTool with summaries from: {summaries_dir}")
+        # LRU cache of documents looked up by title (document id -> document and metadata)
+        self._title_cache = OrderedDict()
+        self._title_cache_lock = threading.Lock()
+        self.title_cache_hits = 0
+        self.title_cache_misses = 0
         
-        # Initialize Ollama embeddings
-        self.embeddings = OllamaEmbeddings(
+        # Embeddings of every document title (document ids, unit-normalised float32 rows), built on first use
+        self._title_index = None
+        self._title_index_lock = threading.Lock()
+        
+        # LRU cache of embedded search queries and titles, keyed by embedding model and text, so repeated
+        # searches skip the Ollama round-trip
+        if embedding_cache is None:
+            embedding_cache = PromptCache(QUERY_EMBEDDING_CACHE_SIZE)
+        self._embedding_cache = embedding_cache
+        
+        logger.info("Initializing RAGTool with summaries from: %s", summaries_dir)
+        
+        # Initialize Ollama embeddings (pooled HTTP connections, batched /api/embed requests)
+        self.embeddings = PooledOllamaEmbeddings(
             model=embedding_model,
-            base_url=ollama_base_url
+            base_url=ollama_base_url,
+            keep_alive=keep_alive
         )
         
         # Initialize ChromaDB
         self.client = chromadb.PersistentClient(path=chroma_db_dir)
         self.collection = self.client.get_or_create_collection(
             name="content_summaries",
-            metadata={"hnsw:space": "cosine"}
+            metadata=HNSW_METADATA
         )
         
-        # Auto-initialize vector store if empty
+        # Embed the summaries that are new or changed since the vector store was last updated
         self._initialize_if_needed()
         
-        logger.info(f"RAGTool initialized with {self.collection.count()} documents in vector store")
+        logger.info("RAGTool initialized with %s documents in vector store", self.collection.count())
     
     def _initialize_if_needed(self):
-        """Initialize vector store if it's empty."""
+        """Initialize the vector store if it's empty, or bring it up to date with the summaries directory."""
         if self.collection.count() > 0:
-            logger.info("Vector store already populated, skipping initialization")
-            return
-        
-        logger.info("Vector store is empty, initializing with PDFs...")
+            logger.info("Vector store already populated, checking for new or changed PDFs...")
+        else:
+            logger.info("Vector store is empty, initializing with PDFs...")
         self.initialize_vector_store()
     
-    def initialize_vector_store(self):
-        """Load all PDFs from summaries directory and create embeddings."""
+    def initialize_vector_store(self, force: bool = False):
+        """
+        Load the PDFs from the summaries directory and create their embeddings. PDFs stored earlier with the
+        same content (SHA-256 recorded in their metadata) are skipped, so only new or changed files are embedded.
+        
+        Args:
+            force: Re-embed every PDF, changed or not
+        """
         if not os.path.exists(self.summaries_dir):
-            logger.error(f"Summaries directory not found: {self.summaries_dir}")
+            logger.error("Summaries directory not found: %s", self.summaries_dir)
             return
         
         pdf_files = [f for f in os.listdir(self.summaries_dir) if f.endswith('.pdf')]
         
         if not pdf_files:
-            logger.warning(f"No PDF files found in {self.summaries_dir}")
+            logger.warning("No PDF files found in %s", self.summaries_dir)
             return
         
-        logger.info(f"Found {len(pdf_files)} PDF files, processing...")
+        hashes = {pdf_file: self._file_sha256(os.path.join(self.summaries_dir, pdf_file)) for pdf_file in pdf_files}
+        if not force:
+            stored = self._stored_hashes()
+            pdf_files = [f for f in pdf_files if hashes[f] is None or stored.get(os.path.splitext(f)[0]) != hashes[f]]
+            if not pdf_files:
+                logger.info("Vector store is up to date with %s", self.summaries_dir)
+                return
         
-        for i, pdf_file in enumerate(pdf_files, 1):
-            try:
-                pdf_path = os.path.join(self.summaries_dir, pdf_file)
-                logger.info(f"[{i}/{len(pdf_files)}] Loading {pdf_file}...")
-                
-                # Load PDF
-                loader = PyPDFLoader(pdf_path)
-                pages = loader.load()
-                
-                # Combine all pages into one document
-                text = "\n".join([page.page_content for page in pages])
-                
-                # Skip empty documents
-                if not text.strip():
-                    logger.warning(f"Skipping empty PDF: {pdf_file}")
+        logger.info("Found %s new or changed PDF files, processing...", len(pdf_files))
+        
+        texts, ids, metadatas = [], [], []
+        # Each batch is sent to Ollama as soon as it is full, so the next PDFs are parsed while it is embedded;
+        # up to EMBED_MAX_WORKERS embedding requests are in flight over the pooled HTTP client
+        with ThreadPoolExecutor(max_workers=EMBED_MAX_WORKERS, thread_name_prefix="ragtool-embed") as executor:
+            batches = []
+            
+            def submit_batch():
+                start = len(batches) * EMBED_BATCH_SIZE
+                # Documents are embedded with the query instruction, as when they were embedded one by one
+                batches.append((start, executor.submit(self.embeddings.embed_queries, texts[start:start + EMBED_BATCH_SIZE])))
+            
+            for i, (pdf_file, load) in enumerate(self._load_pdfs(pdf_files), 1):
+                try:
+                    logger.info("[%s/%s] Loading %s...", i, len(pdf_files), pdf_file)
+                    text = load()
+                    
+                    # Skip empty documents
+                    if not text.strip():
+                        logger.warning("Skipping empty PDF: %s", pdf_file)
+                        continue
+                    
+                    # Use filename without extension as ID for easy lookup
+                    doc_id = os.path.splitext(pdf_file)[0]
+                    texts.append(text)
+                    ids.append(doc_id)
+                    metadatas.append({"filename": pdf_file, "title": doc_id, "sha256": hashes[pdf_file]})
+                    
+                except Exception as e:
+                    logger.error("Error processing %s: %s", pdf_file, e, exc_info=True)
                     continue
                 
-                # Generate embedding
-                logger.info(f"[{i}/{len(pdf_files)}] Generating embedding for {pdf_file}...")
-                embedding = self.embeddings.embed_query(text)
-                
-                # Store in ChromaDB
-                # Use filename without extension as ID for easy lookup
-                doc_id = os.path.splitext(pdf_file)[0]
-                
-                self.collection.add(
-                    documents=[text],
-                    embeddings=[embedding],
-                    ids=[doc_id],
-                    metadatas=[{"filename": pdf_file, "title": doc_id}]
-                )
-                
-                logger.info(f"[{i}/{len(pdf_files)}] Successfully added {pdf_file} to vector store")
-                
-            except Exception as e:
-                logger.error(f"Error processing {pdf_file}: {e}", exc_info=True)
-                continue
+                if len(texts) % EMBED_BATCH_SIZE == 0:
+                    submit_batch()
+            
+            if len(texts) % EMBED_BATCH_SIZE:
+                submit_batch()
+            
+            # Store the batches in order
+            for start, batch in batches:
+                end = start + EMBED_BATCH_SIZE
+                try:
+                    embeddings = batch.result()
+                    
+                    # Upsert replaces the stored version of changed PDFs
+                    self.collection.upsert(
+                        documents=texts[start:end],
+                        embeddings=embeddings,
+                        ids=ids[start:end],
+                        metadatas=metadatas[start:end]
+                    )
+                    logger.info("Added documents %s-%s of %s to vector store", start + 1, start + len(embeddings), len(texts))
+                    
+                except Exception as e:
+                    logger.error("Error embedding or storing %s: %s", ", ".join(ids[start:end]), e, exc_info=True)
+                    continue
+        
+        # Documents may have been added or replaced
+        self.invalidate_title_cache()
+        with self._title_index_lock:
+            self._title_index = None
+        
+        logger.info("Vector store initialization complete! Total documents: %s", self.collection.count())
+    
+    @staticmethod
+    def _file_sha256(path: str) -> Optional[str]:
+        """SHA-256 of a file's content, or None if it cannot be read (the PDF loader reports the error)."""
+        try:
+            with open(path, "rb") as f:
+                return hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            return None
+    
+    def _stored_hashes(self) -> dict:
+        """Content hash of every stored document (document id -> SHA-256, None for documents stored without one)."""
+        results = self.collection.get(include=["metadatas"])
+        metadatas = results['metadatas'] or [{}] * len(results['ids'])
+        return {doc_id: (metadata or {}).get("sha256") for doc_id, metadata in zip(results['ids'], metadatas)}
+    
+    def _load_pdfs(self, pdf_files: list) -> Iterator[Tuple[str, Callable[[], str]]]:
+        """
+        Yield (pdf_file, load) pairs in order, load() returning the text of the PDF or raising its error.
+        Large corpora on multi-core machines are parsed ahead in worker processes; started with 'spawn',
+        as RAGTool is built while other threads are running, which makes fork unsafe.
+        """
+        paths = [os.path.join(self.summaries_dir, pdf_file) for pdf_file in pdf_files]
+        workers = min(os.cpu_count() or 1, len(paths))
+        if workers < 2 or len(paths) < PDF_PROCESS_POOL_MIN_FILES:
+            for pdf_file, path in zip(pdf_files, paths):
+                yield pdf_file, partial(_load_pdf, path)
+            return
         
-        logger.info(f"Vector store initialization complete! Total documents: {self.collection.count()}")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [executor.submit(_load_pdf, path) for path in paths]
+            for pdf_file, future in zip(pdf_files, futures):
+                yield pdf_file, future.result
     
-    def search(self, query: str, top_k: int = 3) -> dict:
+    def search(self, query: str, top_k: int = 3, query_embedding: list = None) -> dict:
         """
         Search for relevant documents based on query.
         
         Args:
             query: Search query
             top_k: Number of top results to return
+            query_embedding: Precomputed embedding of the query (skips the embedding request)
             
         Returns:
             Dictionary with success status, documents, and metadata
         """
         try:
-            logger.info(f"Searching for: '{query}' (top_k={top_k})")
+            logger.info("Searching for: '%s' (top_k=%d)", query, top_k)
             
             # Generate query embedding
-            query_embedding = self.embeddings.embed_query(query)
+            if query_embedding is None:
+                query_embedding = self._embed_queries([query])[0]
             
-            # Search in ChromaDB
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=top_k,
-                include=["documents", "metadatas", "distances"]
-            )
+            return self._query_collection([query_embedding], top_k)[0]
+            
+        except Exception as e:
+            return self._search_error(e)
+    
+    async def asearch(self, query: str, top_k: int = 3, query_embedding: list = None) -> dict:
+        """
+        Async variant of search(): the query is embedded through the pooled async HTTP client
+        and only the ChromaDB lookup runs in a worker thread.
+        
+        Args:
+            query: Search query
+            top_k: Number of top results to return
+            query_embedding: Precomputed embedding of the query (skips the embedding request)
+            
+        Returns:
+            Dictionary with success status, documents, and metadata
+        """
+        try:
+            logger.info("Searching for: '%s' (top_k=%d)", query, top_k)
+            
+            # Generate query embedding
+            if query_embedding is None:
+                query_embedding = (await self._aembed_queries([query]))[0]
+            
+            return (await asyncio.to_thread(self._query_collection, [query_embedding], top_k))[0]
+            
+        except Exception as e:
+            return self._search_error(e)
+    
+    def batch_search(self, queries: list, top_k: int = 3) -> list:
+        """
+        Search for several queries at once: one embedding request and one ChromaDB query for all of them.
+        
+        Args:
+            queries: Search queries
+            top_k: Number of top results to return per query
+            
+        Returns:
+            List with one search result dictionary per query, in the same order
+        """
+        try:
+            logger.info("Searching for %d queries (top_k=%d)", len(queries), top_k)
+            
+            # Generate all uncached query embeddings in one request
+            query_embeddings = self._embed_queries(queries)
+            
+            return self._query_collection(query_embeddings, top_k)
+            
+        except Exception as e:
+            return [self._search_error(e)] * len(queries)
+    
+    def get_titles(self) -> list:
+        """Return the titles of all documents in the vector store (document ids with spaces)."""
+        return [doc_id.replace("_", " ") for doc_id in self.collection.get(include=[])['ids']]
+    
+    def search_titles(self, titles: list) -> list:
+        """
+        Find the documents for titles that have no exact match (e.g. slightly paraphrased by the SQL model).
+        All titles are embedded in one request and compared in memory against the embedded document titles;
+        titles without a close match (TITLE_MATCH_THRESHOLD) fall back to a semantic search of the contents.
+        
+        Args:
+            titles: Content titles to look up
             
+        Returns:
+            List with one search result dictionary (top 1) per title, in the same order
+        """
+        try:
+            logger.info("Matching %d titles against document titles", len(titles))
+            return self._match_titles(self._embed_queries(titles))
+        except Exception as e:
+            return [self._search_error(e)] * len(titles)
+    
+    async def asearch_titles(self, titles: list) -> list:
+        """
+        Async variant of search_titles(): the titles are embedded through the pooled async HTTP client
+        and only the in-memory matching and ChromaDB lookups run in a worker thread.
+        
+        Args:
+            titles: Content titles to look up
+            
+        Returns:
+            List with one search result dictionary (top 1) per title, in the same order
+        """
+        try:
+            logger.info("Matching %d titles against document titles", len(titles))
+            title_embeddings = await self._aembed_queries(titles)
+            return await asyncio.to_thread(self._match_titles, title_embeddings)
+        except Exception as e:
+            return [self._search_error(e)] * len(titles)
+    
+    def _embed_queries(self, queries: list) -> list:
+        """Embed search queries, sending the ones not in the query embedding cache in one request."""
+        found = self._get_cached_embeddings(queries)
+        missing = list(dict.fromkeys(query for query in queries if query not in found))
+        if missing:
+            fetched = dict(zip(missing, self.embeddings.embed_queries(missing)))
+            self._cache_embeddings(fetched)
+            found.update(fetched)
+        return [found[query] for query in queries]
+    
+    async def _aembed_queries(self, queries: list) -> list:
+        """Async variant of _embed_queries(), sent through the pooled async HTTP client."""
+        found = self._get_cached_embeddings(queries)
+        missing = list(dict.fromkeys(query for query in queries if query not in found))
+        if missing:
+            fetched = dict(zip(missing, await self.embeddings.aembed_queries(missing)))
+            self._cache_embeddings(fetched)
+            found.update(fetched)
+        return [found[query] for query in queries]
+    
+    def _get_cached_embeddings(self, queries: list) -> dict:
+        """Return the cached embeddings among queries (query -> embedding), updating LRU order."""
+        found = {}
+        for query in queries:
+            embedding = self._embedding_cache.get(self.embedding_model, query)
+            if embedding is not None:
+                found[query] = embedding
+        return found
+    
+    def _cache_embeddings(self, embeddings: dict):
+        """Store query embeddings, evicting the least recently used ones when full."""
+        for query, embedding in embeddings.items():
+            self._embedding_cache.put(self.embedding_model, query, embedding)
+    
+    def _match_titles(self, title_embeddings: list) -> list:
+        """Match title embeddings against the document titles, falling back to a semantic search of the contents."""
+        doc_ids, title_matrix = self._get_title_index()
+        
+        results = [None] * len(title_embeddings)
+        if doc_ids:
+            vectors = np.asarray(title_embeddings, dtype=np.float32)
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            similarities = vectors @ title_matrix.T
+            best = similarities.argmax(axis=1)
+            
+            matches = {
+                i: (doc_ids[j], float(similarities[i, j]))
+                for i, j in enumerate(best) if similarities[i, j] >= TITLE_MATCH_THRESHOLD
+            }
+            documents = self._get_documents_by_ids({doc_id for doc_id, _ in matches.values()})
+            for i, (doc_id, similarity) in matches.items():
+                if doc_id in documents:
+                    results[i] = {
+                        "success": True,
+                        "documents": [documents[doc_id]["document"]],
+                        "metadatas": [documents[doc_id]["metadata"]],
+                        "similarities": [similarity],
+                        "count": 1
+                    }
+        
+        unmatched = [i for i, result in enumerate(results) if result is None]
+        if unmatched:
+            searched = self._query_collection([title_embeddings[i] for i in unmatched], 1)
+            for i, result in zip(unmatched, searched):
+                results[i] = result
+        
+        return results
+    
+    def _get_title_index(self) -> tuple:
+        """Return (document ids, title embedding matrix), embedding all document titles in one request the first time."""
+        with self._title_index_lock:
+            if self._title_index is None:
+                results = self.collection.get(include=["metadatas"])
+                doc_ids = results['ids']
+                metadatas = results['metadatas'] or [{}] * len(doc_ids)
+                titles = [(metadata or {}).get("title", doc_id).replace("_", " ") for doc_id, metadata in zip(doc_ids, metadatas)]
+                
+                matrix = np.zeros((0, 0), dtype=np.float32)
+                if titles:
+                    matrix = np.asarray(self.embeddings.embed_queries(titles), dtype=np.float32)
+                    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+                
+                self._title_index = (doc_ids, matrix)
+                logger.info("Embedded %d document titles for title matching", len(doc_ids))
+            return self._title_index
+    
+    def _query_collection(self, query_embeddings: list, top_k: int) -> list:
+        """
+        Run a nearest-neighbour query in ChromaDB and format the results of each query embedding.
+        The query only returns ids, metadata and distances; document texts come from the title cache,
+        so ChromaDB only loads the ones not retrieved before (in one lookup for all queries).
+        """
+        # Search in ChromaDB
+        results = self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=top_k,
+            include=["metadatas", "distances"]
+        )
+        
+        found = self._get_documents_by_ids({doc_id for ids in results['ids'] for doc_id in ids})
+        
+        formatted = []
+        for q in range(len(query_embeddings)):
             # Format results
-            documents = results['documents'][0] if results['documents'] else []
-            metadatas = results['metadatas'][0] if results['metadatas'] else []
-            distances = results['distances'][0] if results['distances'] else []
+            hits = [(doc_id, distance) for doc_id, distance in zip(results['ids'][q], results['distances'][q]) if doc_id in found]
+            documents = [found[doc_id]["document"] for doc_id, _ in hits]
+            metadatas = [found[doc_id]["metadata"] for doc_id, _ in hits]
+            distances = [distance for _, distance in hits]
             
-            # Convert distances to similarity scores (1 - cosine distance)
-            similarities = [1 - dist for dist in distances]
+            # Convert distances to similarity scores (1 - cosine distance) in one vectorized pass
+            similarities = np.subtract(1.0, np.asarray(distances, dtype=np.float64)).tolist()
             
-            logger.info(f"Found {len(documents)} relevant documents")
-            for i, (meta, sim) in enumerate(zip(metadatas, similarities)):
-                logger.info(f"  [{i+1}] {meta.get('title', 'Unknown')} (similarity: {sim:.3f})")
+            logger.info("Found %d relevant documents", len(documents))
+            if logger.isEnabledFor(logging.INFO):
+                for i, (meta, sim) in enumerate(zip(metadatas, similarities)):
+                    logger.info("  [%d] %s (similarity: %.3f)", i + 1, meta.get('title', 'Unknown'), sim)
             
-            return {
+            formatted.append({
                 "success": True,
                 "documents": documents,
                 "metadatas": metadatas,
                 "similarities": similarities,
                 "count": len(documents)
-            }
-            
-        except Exception as e:
-            error_msg = f"Error searching documents: {str(e)}"
-            logger.error(error_msg, exc_info=True)
-            return {
-                "success": False,
-                "error": error_msg,
-                "documents": [],
-                "metadatas": [],
-                "similarities": [],
-                "count": 0
-            }
+            })
+        
+        return formatted
+    
+    def _search_error(self, e: Exception) -> dict:
+        """Build the failed search result for an exception."""
+        error_msg = f"Error searching documents: {str(e)}"
+        logger.exception(error_msg)
+        return {
+            "success": False,
+            "error": error_msg,
+            "documents": [],
+            "metadatas": [],
+            "similarities": [],
+            "count": 0
+        }
     
     def get_document_by_title(self, title: str) -> dict:
         """
@@ -177,7 +506,7 @@ class RAGTool:
             Dictionary with success status and document content
         """
         try:
-            logger.info(f"Retrieving document by title: '{title}'")
+            logger.info("Retrieving document by title: '%s'", title)
             
             # Normalize title (replace spaces with underscores)
             normalized_title = title.replace(" ", "_")
@@ -189,14 +518,14 @@ class RAGTool:
             )
             
             if results['documents']:
-                logger.info(f"Found document: {normalized_title}")
+                logger.info("Found document: %s", normalized_title)
                 return {
                     "success": True,
                     "document": results['documents'][0],
                     "metadata": results['metadatas'][0] if results['metadatas'] else {}
                 }
             else:
-                logger.warning(f"Document not found: {normalized_title}")
+                logger.warning("Document not found: %s", normalized_title)
                 return {
                     "success": False,
                     "error": f"Document '{title}' not found in vector store"
@@ -209,3 +538,84 @@ class RAGTool:
                 "success": False,
                 "error": error_msg
             }
+    
+    def get_documents_by_titles(self, titles: list) -> dict:
+        """
+        Retrieve several documents by title with a single ChromaDB lookup.
+        Recently retrieved documents are served from the title cache.
+        
+        Args:
+            titles: Titles of the documents (without .pdf extension)
+            
+        Returns:
+            Dictionary mapping each title found to its document content and metadata
+        """
+        try:
+            logger.info("Retrieving %d documents by title", len(titles))
+            
+            # Normalize titles (replace spaces with underscores)
+            ids_by_title = {title: title.replace(" ", "_") for title in titles}
+            
+            found = self._get_documents_by_ids(set(ids_by_title.values()))
+            
+            return {title: found[doc_id] for title, doc_id in ids_by_title.items() if doc_id in found}
+            
+        except Exception as e:
+            logger.error("Error retrieving documents: %s", e, exc_info=True)
+            return {}
+    
+    def _get_documents_by_ids(self, doc_ids: set) -> dict:
+        """Fetch documents by id through the title cache, with one ChromaDB lookup for the uncached ones."""
+        found = self._get_cached_documents(doc_ids)
+        missing = [doc_id for doc_id in doc_ids if doc_id not in found]
+        
+        if missing:
+            results = self.collection.get(
+                ids=missing,
+                include=["documents", "metadatas"]
+            )
+            
+            metadatas = results['metadatas'] or [{}] * len(results['ids'])
+            fetched = {
+                doc_id: {"document": document, "metadata": metadata or {}}
+                for doc_id, document, metadata in zip(results['ids'], results['documents'], metadatas)
+            }
+            self._cache_documents(fetched)
+            found.update(fetched)
+        
+        logger.info("Found %d of %d documents (%d cached)", len(found), len(doc_ids), len(doc_ids) - len(missing))
+        return found
+    
+    def _get_cached_documents(self, doc_ids: set) -> dict:
+        """Return the cached documents among doc_ids, updating LRU order and hit/miss counters."""
+        with self._title_cache_lock:
+            found = {}
+            for doc_id in doc_ids:
+                if doc_id in self._title_cache:
+                    self._title_cache.move_to_end(doc_id)
+                    found[doc_id] = self._title_cache[doc_id]
+            self.title_cache_hits += len(found)
+            self.title_cache_misses += len(doc_ids) - len(found)
+            return found
+    
+    def _cache_documents(self, documents: dict):
+        """Store documents by id, evicting the least recently used ones when full."""
+        with self._title_cache_lock:
+            self._title_cache.update(documents)
+            for doc_id in documents:
+                self._title_cache.move_to_end(doc_id)
+            while len(self._title_cache) > TITLE_CACHE_SIZE:
+                self._title_cache.popitem(last=False)
+    
+    def invalidate_title_cache(self, title: str = None):
+        """
+        Drop cached title lookups.
+        
+        Args:
+            title: Only drop this title (default: drop every cached document)
+        """
+        with self._title_cache_lock:
+            if title is None:
+                self._title_cache.clear()
+            else:
+                self._title_cache.pop(title.replace(" ", "_"), None)
@@ -3,16 +3,147 @@ SQL Tool for executing SQL queries against the streaming database.
 This tool validates, executes, and returns results from SQL queries.
 """
 
+import itertools
 import logging
-from textwrap import dedent
-from typing import Dict, Any, Optional, Tuple
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+from textwrap import TextWrapper, dedent
+from typing import Dict, Any, List, Optional, Tuple
 import psycopg2
 from psycopg2 import Error as PostgresError
-import sqlparse
+from psycopg2.extensions import connection as PostgresConnection
+from psycopg2.pool import ThreadedConnectionPool
 from tabulate import tabulate
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of database connections kept open by each SQLTool
+CONNECTION_POOL_SIZE = 8
+
+# Maximum number of prepared statements kept on each connection
+PREPARED_STATEMENT_CACHE_SIZE = 128
+
+# Maximum number of rows fetched per query; psycopg2 only builds Python rows for what is fetched
+MAX_RESULT_ROWS = 1000
+
+# Text cells longer than this are wrapped over several lines in formatted results. They are wrapped while
+# the rows are converted, and only when needed: tabulate's maxcolwidths re-wraps every cell in extra passes
+MAX_COLUMN_WIDTH = 50
+
+# Queries without a row limit of their own get LIMIT MAX_RESULT_ROWS + 1 appended, so PostgreSQL stops
+# early instead of sending (and libpq buffering) the whole result. A LIMIT/FETCH anywhere in the query's
+# code, e.g. in a subquery, leaves it untouched; one inside a literal or comment does not count.
+ROW_LIMIT_RE = re.compile(r"\b(?:LIMIT|FETCH)\b", re.IGNORECASE)
+
+# String literals, quoted identifiers and comments; masked out before looking at a query's leading keyword
+# and statement separators, so a ';' or keyword inside them does not count. Each construct starts where
+# PostgreSQL's lexer starts it: E'...' strings end at an unescaped quote, a dollar quote cannot follow
+# an identifier character ('a$x$' is an identifier) and its tag cannot start with a digit ('$1' is a
+# parameter), and a line comment also ends at a carriage return. Nested block comments are rejected
+# by validate_sql, as the non-nesting match would end them too early.
+SQL_QUOTED_OR_COMMENT_RE = re.compile(
+    r"(?P<quoted>(?<![\w$])[Ee]'(?:[^'\\]|\\.|'')*'|'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\""
+    r"|(?<![\w$])\$(?P<tag>(?:[^\W\d]\w*)?)\$.*?\$(?P=tag)\$)"
+    r"|(?P<comment>--[^\r\n]*|/\*.*?\*/)",
+    re.DOTALL
+)
+
+# Leading keyword of a (masked) query
+SQL_FIRST_WORD_RE = re.compile(r"\s*(\w+)")
+
+# Statement keywords sqlparse classifies as DML
+SQL_DML_KEYWORDS = frozenset({
+    "SELECT", "INSERT", "UPDATE", "DELETE", "MERGE", "UPSERT", "REPLACE", "COMMIT", "ROLLBACK", "START"
+})
+
+# Keywords rejected anywhere in a query, found in one scan. Whole words only, so identifiers and text
+# such as update_time or 'Created' pass; the SELECT-only and single-statement checks block the rest
+DANGEROUS_KEYWORD_RE = re.compile(r"\b(?:DROP|DELETE|INSERT|UPDATE|ALTER|CREATE|TRUNCATE)\b", re.IGNORECASE)
+
+# Foreign key comments written by _read_schema: "-- table.column can be joined with ref_table.ref_column"
+SCHEMA_FOREIGN_KEY_RE = re.compile(r"^-- (\w+)\.\w+ can be joined with (\w+)\.\w+$", re.MULTILINE)
+
+# Literals turned into statement parameters, so queries differing only in constants share a plan:
+# string literals, and numbers compared against or used as LIMIT/OFFSET. Typed literals
+# (INTERVAL '7 days', DATE '2024-01-01') and positional ORDER BY/GROUP BY numbers stay inline.
+# Number placeholders are cast to the type PostgreSQL gives the inline literal: an untyped parameter
+# takes the type of the column it is compared with, so 3.5 against an integer column would become 4.
+# Comments, quoted identifiers, dollar-quoted strings and prefixed strings (E'...', B'...', X'...',
+# N'...', U&'...') are kept verbatim, never searched for literals.
+SQL_LITERAL_RE = re.compile(
+    r"(?P<keep>--[^\r\n]*|/\*.*?\*/|\"(?:[^\"]|\"\")*\""
+    r"|(?<![\w$])E'(?:[^'\\]|\\.|'')*'|(?<![\w$])(?:[BXN]|U&)'(?:[^']|'')*'"
+    r"|(?<![\w$])\$(?P<tag>(?:[^\W\d]\w*)?)\$.*?\$(?P=tag)\$)"
+    r"|(?P<typed>\b(?:INTERVAL|DATE|TIME|TIMESTAMP)\s*'(?:[^']|'')*')"
+    r"|(?P<string>'(?:[^']|'')*')"
+    r"|(?P<prefix>(?:[=<>]|\bLIMIT|\bOFFSET)\s*)(?P<number>\d+(?:\.\d+)?)(?![\w.])",
+    re.IGNORECASE | re.DOTALL
+)
+
+# Largest values of PostgreSQL's integer and bigint types
+INT4_MAX = 2**31 - 1
+INT8_MAX = 2**63 - 1
+
+
+def mask_sql(query: str) -> str:
+    """Replace the literals of a query with '' and its comments with a space (see SQL_QUOTED_OR_COMMENT_RE)."""
+    return SQL_QUOTED_OR_COMMENT_RE.sub(lambda m: "''" if m.group("quoted") else " ", query)
+
+
+def parameterize_sql(query: str) -> Tuple[str, List[Any]]:
+    """
+    Replace literals in a query with $n placeholders and collapse whitespace, so queries that only
+    differ in constants or line breaks/indentation share one prepared statement.
+    
+    Args:
+        query: SQL query with inline literals
+        
+    Returns:
+        Tuple of (query with placeholders, parameter values in placeholder order)
+    """
+    params = []
+    verbatim = False
+    
+    def replace(match):
+        nonlocal verbatim
+        if match.group("keep"):
+            verbatim = True
+            return match.group("keep")
+        if match.group("typed"):
+            return match.group("typed")
+        if match.group("string"):
+            params.append(match.group("string")[1:-1].replace("''", "'"))
+            return f"${len(params)}"
+        number = match.group("number")
+        if "." in number:
+            params.append(Decimal(number))
+            cast = "numeric"
+        else:
+            params.append(int(number))
+            cast = "integer" if params[-1] <= INT4_MAX else "bigint" if params[-1] <= INT8_MAX else "numeric"
+        return f"{match.group('prefix')}${len(params)}::{cast}"
+    
+    text = SQL_LITERAL_RE.sub(replace, query.strip().rstrip(";"))
+    
+    # Whitespace is significant in comments, quoted identifiers and the strings kept verbatim
+    if not verbatim:
+        text = " ".join(text.split())
+    
+    return text, params
+
+
+class PreparedConnection(PostgresConnection):
+    """Read-only autocommit connection that remembers its prepared statements (parameterized SQL -> name)."""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Autocommit keeps SELECTs from leaving the session idle in a transaction
+        self.set_session(readonly=True, autocommit=True)
+        self.statements = OrderedDict()
+
 
 class SQLTool:
     """Tool for executing SQL queries with validation and schema awareness."""
@@ -26,24 +157,50 @@ class SQLTool:
         """
         self.db_config = db_config
         self.schema_cache = None
+        
+        # Connection pool, opened on first use; the semaphore makes callers wait for a free connection
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._pool_slots = threading.BoundedSemaphore(CONNECTION_POOL_SIZE)
+        self._statement_ids = itertools.count(1)
         logger.info("SQLTool initialized")
     
-    def get_database_schema(self) -> str:
+    def get_database_schema(self, refresh: bool = False) -> str:
         """
         Retrieve the complete database schema for context.
         
+        Args:
+            refresh: Ignore the cached schema and fetch it again from the database
+        
         Returns:
             String representation of the database schema in CREATE TABLE format
         """
+        if refresh:
+            self.schema_cache = None
+        
         if self.schema_cache:
             return self.schema_cache
         
         try:
-            conn = psycopg2.connect(**self.db_config)
-            cursor = conn.cursor()
+            with self._connection() as conn:
+                schema_parts = self._read_schema(conn)
             
-            schema_parts = []
+            self.schema_cache = "\n".join(schema_parts)
+            logger.info("Database schema retrieved and cached")
+            return self.schema_cache
             
+        except PostgresError as e:
+            error_msg = f"Error retrieving database schema: {str(e)}"
+            logger.error(error_msg)
+            return error_msg
+    
+    def _read_schema(self, conn) -> List[str]:
+        """
+        Read the CREATE TABLE statements and foreign key comments that make up the schema.
+        Three catalog queries (tables, all columns, all foreign keys) grouped per table in Python,
+        instead of two round-trips per table.
+        """
+        with conn.cursor() as cursor:
             # Get all tables
             cursor.execute(dedent("""
                 SELECT table_name 
@@ -53,90 +210,101 @@ class SQLTool:
             """))
             tables = cursor.fetchall()
             
-            for (table_name,) in tables:
-                # Start CREATE TABLE statement
-                schema_parts.append(f"\nCREATE TABLE {table_name} (")
-                
-                # Get columns for each table
-                cursor.execute(dedent("""
-                    SELECT 
-                        column_name, 
-                        data_type,
-                        character_maximum_length,
-                        is_nullable,
-                        column_default
-                    FROM information_schema.columns 
-                    WHERE table_name = %s 
-                    ORDER BY ordinal_position;
-                """), (table_name,))
-                
-                columns = cursor.fetchall()
-                column_defs = []
-                
-                for col_name, data_type, char_max_len, is_nullable, col_default in columns:
-                    # Format data type with length if applicable
-                    if char_max_len and data_type == 'character varying':
-                        type_str = f"VARCHAR({char_max_len})"
-                    elif data_type == 'integer':
-                        type_str = "INTEGER"
-                    elif data_type == 'timestamp without time zone':
-                        type_str = "TIMESTAMP"
-                    elif data_type.startswith('numeric'):
-                        type_str = data_type.upper()
-                    else:
-                        type_str = data_type.upper()
-                    
-                    # Build column definition
-                    col_def = f"  {col_name} {type_str}"
-                    
-                    # Add constraints
-                    if col_default and 'nextval' in col_default:
-                        col_def += " PRIMARY KEY"  # Typically SERIAL columns
-                    elif is_nullable == "NO":
-                        col_def += " NOT NULL"
-                    
-                    column_defs.append(col_def)
+            # Get the columns of every table
+            cursor.execute(dedent("""
+                SELECT 
+                    table_name,
+                    column_name, 
+                    data_type,
+                    character_maximum_length,
+                    is_nullable,
+                    column_default
+                FROM information_schema.columns 
+                WHERE table_schema = 'public' 
+                ORDER BY table_name, ordinal_position;
+            """))
+            columns_by_table = defaultdict(list)
+            for table_name, *column in cursor.fetchall():
+                columns_by_table[table_name].append(column)
+            
+            # Get the foreign keys of every table
+            cursor.execute(dedent("""
+                SELECT
+                    tc.table_name,
+                    kcu.column_name,
+                    ccu.table_name AS foreign_table_name,
+                    ccu.column_name AS foreign_column_name
+                FROM information_schema.table_constraints AS tc
+                JOIN information_schema.key_column_usage AS kcu
+                    ON tc.constraint_name = kcu.constraint_name
+                    AND tc.table_schema = kcu.table_schema
+                JOIN information_schema.constraint_column_usage AS ccu
+                    ON ccu.constraint_name = tc.constraint_name
+                    AND ccu.table_schema = tc.table_schema
+                WHERE tc.constraint_type = 'FOREIGN KEY'
+                    AND tc.table_schema = 'public';
+            """))
+            fkeys_by_table = defaultdict(list)
+            for table_name, *fkey in cursor.fetchall():
+                fkeys_by_table[table_name].append(fkey)
+        
+        schema_parts = []
+        for (table_name,) in tables:
+            # Start CREATE TABLE statement
+            schema_parts.append(f"\nCREATE TABLE {table_name} (")
+            
+            column_defs = []
+            for col_name, data_type, char_max_len, is_nullable, col_default in columns_by_table[table_name]:
+                # Format data type with length if applicable
+                if char_max_len and data_type == 'character varying':
+                    type_str = f"VARCHAR({char_max_len})"
+                elif data_type == 'integer':
+                    type_str = "INTEGER"
+                elif data_type == 'timestamp without time zone':
+                    type_str = "TIMESTAMP"
+                elif data_type.startswith('numeric'):
+                    type_str = data_type.upper()
+                else:
+                    type_str = data_type.upper()
                 
-                schema_parts.append(",\n".join(column_defs))
-                schema_parts.append(");")
+                # Build column definition
+                col_def = f"  {col_name} {type_str}"
                 
-                # Add foreign key information as comments
-                cursor.execute(dedent("""
-                    SELECT
-                        kcu.column_name,
-                        ccu.table_name AS foreign_table_name,
-                        ccu.column_name AS foreign_column_name
-                    FROM information_schema.table_constraints AS tc
-                    JOIN information_schema.key_column_usage AS kcu
-                        ON tc.constraint_name = kcu.constraint_name
-                        AND tc.table_schema = kcu.table_schema
-                    JOIN information_schema.constraint_column_usage AS ccu
-                        ON ccu.constraint_name = tc.constraint_name
-                        AND ccu.table_schema = tc.table_schema
-                    WHERE tc.constraint_type = 'FOREIGN KEY'
-                        AND tc.table_name = %s;
-                """), (table_name,))
+                # Add constraints
+                if col_default and 'nextval' in col_default:
+                    col_def += " PRIMARY KEY"  # Typically SERIAL columns
+                elif is_nullable == "NO":
+                    col_def += " NOT NULL"
                 
-                fkeys = cursor.fetchall()
-                if fkeys:
-                    for col, ref_table, ref_col in fkeys:
-                        schema_parts.append(f"-- {table_name}.{col} can be joined with {ref_table}.{ref_col}")
+                column_defs.append(col_def)
             
-            cursor.close()
-            conn.close()
+            schema_parts.append(",\n".join(column_defs))
+            schema_parts.append(");")
             
-            self.schema_cache = "\n".join(schema_parts)
-            logger.info("Database schema retrieved and cached")
-            return self.schema_cache
-            
-        except PostgresError as e:
-            error_msg = f"Error retrieving database schema: {str(e)}"
-            logger.error(error_msg)
-            return error_msg
+            # Add foreign key information as comments
+            for col, ref_table, ref_col in fkeys_by_table[table_name]:
+                schema_parts.append(f"-- {table_name}.{col} can be joined with {ref_table}.{ref_col}")
+        
+        return schema_parts
+    
+    @staticmethod
+    def split_schema(schema: str) -> Dict[str, str]:
+        """
+        Split a schema returned by get_database_schema() into its tables.
+        
+        Returns:
+            Mapping of table name to its CREATE TABLE statement and foreign key comments, in schema order.
+            Joining the values of any subset with "\n" gives a schema in the same format.
+        """
+        tables = {}
+        for block in schema.split("\nCREATE TABLE ")[1:]:
+            tables[block.split(" ", 1)[0]] = "\nCREATE TABLE " + block.rstrip("\n")
+        return tables
     
     def validate_sql(self, query: str) -> Tuple[bool, Optional[str]]:
         """
         Validate SQL query for safety and correctness.
+        Runs on every query, so it is a few precompiled regex scans rather than a full SQL parse.
         
         Args:
             query: SQL query string to validate
@@ -144,41 +312,43 @@ class SQLTool:
         Returns:
             Tuple of (is_valid, error_message)
         """
-        # Parse and format the query
-        try:
-            parsed = sqlparse.parse(query)
-            if not parsed:
-                return False, "Empty or invalid SQL query"
-            
-            # Get the first statement
-            statement = parsed[0]
-            
-            # Check if it's a SELECT statement
-            first_token = statement.token_first(skip_ws=True, skip_cm=True)
-            if not first_token or first_token.ttype is not sqlparse.tokens.Keyword.DML:
-                return False, "Query must be a DML statement"
-            
-            if first_token.value.upper() != 'SELECT':
-                return False, "Only SELECT queries are allowed"
-            
-            # Check for dangerous patterns
-            query_upper = query.upper()
-            dangerous_keywords = ['DROP', 'DELETE', 'INSERT', 'UPDATE', 'ALTER', 'CREATE', 'TRUNCATE']
-            for keyword in dangerous_keywords:
-                if keyword in query_upper:
-                    return False, f"Dangerous keyword '{keyword}' detected. Only SELECT queries are allowed."
-            
-            # Check for multiple statements (SQL injection attempt)
-            if len(parsed) > 1:
-                return False, "Multiple SQL statements are not allowed"
-            
-            logger.info("SQL query validated successfully")
-            return True, None
-            
-        except Exception as e:
-            error_msg = f"SQL validation error: {str(e)}"
-            logger.error(error_msg)
-            return False, error_msg
+        if not query.strip():
+            return False, "Empty or invalid SQL query"
+        
+        # Backslash escapes (E'...' strings, U&'...' UESCAPE, or plain strings on a server without
+        # standard_conforming_strings) change where literals end; when in doubt, reject
+        if "\\" in query:
+            return False, "Backslash escapes are not allowed in SQL queries"
+        
+        for match in SQL_QUOTED_OR_COMMENT_RE.finditer(query):
+            comment = match.group("comment")
+            if comment and comment.startswith("/*") and "/*" in comment[2:]:
+                return False, "Nested comments are not allowed in SQL queries"
+        
+        # Literals and comments masked out (literals keep a non-word placeholder)
+        code = mask_sql(query)
+        
+        # Check if it's a SELECT statement
+        first_word = SQL_FIRST_WORD_RE.match(code)
+        keyword = first_word.group(1).upper() if first_word else None
+        if keyword not in SQL_DML_KEYWORDS:
+            return False, "Query must be a DML statement"
+        
+        if keyword != 'SELECT':
+            return False, "Only SELECT queries are allowed"
+        
+        # Check for dangerous patterns (outside literals and comments)
+        match = DANGEROUS_KEYWORD_RE.search(code)
+        if match:
+            return False, f"Dangerous keyword '{match.group().upper()}' detected. Only SELECT queries are allowed."
+        
+        # Check for multiple statements (SQL injection attempt); a single trailing ';' is allowed
+        code = code.rstrip()
+        if ";" in (code[:-1] if code.endswith(";") else code):
+            return False, "Multiple SQL statements are not allowed"
+        
+        logger.info("SQL query validated successfully")
+        return True, None
     
     def execute_query(self, query: str) -> Dict[str, Any]:
         """
@@ -190,12 +360,12 @@ class SQLTool:
         Returns:
             Dictionary with execution results or error information
         """
-        logger.info(f"Executing SQL query: {query}")
+        logger.info("Executing SQL query: %s", query)
         
         # Validate query first
         is_valid, validation_error = self.validate_sql(query)
         if not is_valid:
-            logger.error(f"Query validation failed: {validation_error}")
+            logger.error("Query validation failed: %s", validation_error)
             return {
                 "success": False,
                 "error": validation_error,
@@ -203,29 +373,28 @@ class SQLTool:
             }
         
         try:
-            # Connect to database
-            conn = psycopg2.connect(**self.db_config)
-            cursor = conn.cursor()
-            
-            # Execute query
-            cursor.execute(query)
-            
-            # Fetch results
-            rows = cursor.fetchall()
-            columns = [desc[0] for desc in cursor.description] if cursor.description else []
+            with self._connection() as conn, conn.cursor() as cursor:
+                # Execute query
+                self._execute_prepared(conn, cursor, self._limit_rows(query))
+                
+                # Fetch results (one extra row tells whether the result was truncated)
+                rows = cursor.fetchmany(MAX_RESULT_ROWS + 1)
+                columns = [desc[0] for desc in cursor.description] if cursor.description else []
             
-            # Close connection
-            cursor.close()
-            conn.close()
+            truncated = len(rows) > MAX_RESULT_ROWS
+            if truncated:
+                del rows[MAX_RESULT_ROWS:]
+                logger.warning("Query returned more than %s rows, keeping the first %s", MAX_RESULT_ROWS, MAX_RESULT_ROWS)
             
-            logger.info(f"Query executed successfully. Returned {len(rows)} rows")
+            logger.info("Query executed successfully. Returned %s rows", len(rows))
             
             return {
                 "success": True,
                 "query": query,
                 "columns": columns,
                 "rows": rows,
-                "row_count": len(rows)
+                "row_count": len(rows),
+                "truncated": truncated
             }
             
         except PostgresError as e:
@@ -245,6 +414,82 @@ class SQLTool:
                 "query": query
             }
     
+    def _get_pool(self) -> ThreadedConnectionPool:
+        """Return the connection pool, opening it on first use."""
+        with self._pool_lock:
+            if self._pool is None or self._pool.closed:
+                self._pool = ThreadedConnectionPool(
+                    1, CONNECTION_POOL_SIZE, connection_factory=PreparedConnection, **self.db_config
+                )
+            return self._pool
+    
+    @contextmanager
+    def _connection(self):
+        """
+        Borrow a pooled connection for the duration of the block.
+        Connections that fail at the connection level are closed instead of being returned to the pool.
+        """
+        with self._pool_slots:
+            pool = self._get_pool()
+            conn = pool.getconn()
+            discard = False
+            try:
+                yield conn
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                discard = True
+                raise
+            finally:
+                pool.putconn(conn, close=discard or conn.closed)
+    
+    def close(self):
+        """Close all pooled database connections."""
+        with self._pool_lock:
+            if self._pool is not None and not self._pool.closed:
+                self._pool.closeall()
+            self._pool = None
+    
+    @staticmethod
+    def _limit_rows(query: str) -> str:
+        """Cap a validated query at MAX_RESULT_ROWS + 1 rows (the extra row tells whether it was truncated)."""
+        if ROW_LIMIT_RE.search(mask_sql(query)):
+            return query
+        # On its own line, so a trailing line comment cannot swallow it
+        return f"{query.strip().rstrip(';')}\nLIMIT {MAX_RESULT_ROWS + 1}"
+    
+    def _execute_prepared(self, conn: PreparedConnection, cursor, query: str):
+        """
+        Execute a query through a cached prepared statement, so repeated query shapes skip parsing and planning.
+        Falls back to executing the query as-is when it cannot be prepared.
+        """
+        text, params = parameterize_sql(query)
+        statements = conn.statements
+        
+        name = statements.get(text)
+        if name is None:
+            name = f"sqlagent_stmt_{next(self._statement_ids)}"
+            try:
+                cursor.execute(f"PREPARE {name} AS {text}")
+            except PostgresError as e:
+                # Only a query that validates as a single SELECT statement may run unprepared
+                if not self.validate_sql(query)[0]:
+                    raise
+                logger.debug("Could not prepare query, executing it directly: %s", e)
+                cursor.execute(query)
+                return
+            
+            statements[text] = name
+            if len(statements) > PREPARED_STATEMENT_CACHE_SIZE:
+                _, evicted = statements.popitem(last=False)
+                cursor.execute(f"DEALLOCATE {evicted}")
+        else:
+            statements.move_to_end(text)
+            logger.info("Reusing prepared statement %s", name)
+        
+        if params:
+            cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+        else:
+            cursor.execute(f"EXECUTE {name}")
+    
     def format_results(self, results: Dict[str, Any]) -> str:
         """
         Format query results for display.
@@ -261,7 +506,8 @@ class SQLTool:
         if results["row_count"] == 0:
             return "✓ Query executed successfully but returned no results."
         
-        # Convert rows to handle NULL values properly
+        # Convert rows to handle NULL values properly, wrapping long text in the same pass
+        wrapper = TextWrapper(width=MAX_COLUMN_WIDTH)
         formatted_rows = []
         for row in results["rows"]:
             formatted_row = []
@@ -271,15 +517,19 @@ class SQLTool:
                 elif isinstance(cell, (int, float)):
                     formatted_row.append(cell)
                 else:
-                    formatted_row.append(str(cell))
+                    cell = str(cell)
+                    if len(cell) > MAX_COLUMN_WIDTH or not cell.isprintable():
+                        cell = "\n".join(wrapper.wrap(cell))
+                    formatted_row.append(cell)
             formatted_rows.append(formatted_row)
         
         # Create table with tabulate
         table = tabulate(
             formatted_rows,
             headers=results["columns"],
-            tablefmt="grid",
-            maxcolwidths=50
+            tablefmt="grid"
         )
         
+        if results.get("truncated"):
+            return f"✓ Query returned more than {results['row_count']} row(s), showing the first {results['row_count']}:\n\n{table}"
         return f"✓ Query returned {results['row_count']} row(s):\n\n{table}"
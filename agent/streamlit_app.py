@@ -4,25 +4,29 @@ Streamlit GUI for the SQL AI Agent.
 """
 
 import os
+import queue
 import sys
 import logging
 import time
 import streamlit as st
 from dotenv import load_dotenv
 from agent import SQLAgent
+from config import Config
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("agent.log"),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Configure logging. Streamlit re-runs this script on every interaction; without the guard each
+# rerun would open another FileHandler (basicConfig ignores it, but the file stays open)
+if not logging.getLogger().handlers:
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler("agent.log"),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
 
 logger = logging.getLogger(__name__)
 
@@ -89,7 +93,7 @@ def get_database_info():
         # Try to get schema info from the agent if available
         return db_info
     except Exception as e:
-        logger.error(f"Error getting database info: {e}")
+        logger.error("Error getting database info: %s", e)
         return None
 
 
@@ -106,7 +110,7 @@ def test_database_connection(agent):
             return True, table_count, schema
         return False, 0, None
     except Exception as e:
-        logger.error(f"Database connection test failed: {e}")
+        logger.error("Database connection test failed: %s", e)
         return False, 0, None
 
 
@@ -118,14 +122,13 @@ def initialize_agent(model_provider="ollama"):
         model_provider: "ollama" or "groq"
     """
     
-    # Load database configuration
-    db_config = {
-        "host": os.getenv("DB_HOST"),
-        "port": int(os.getenv("DB_PORT")),
-        "database": os.getenv("DB_NAME"),
-        "user": os.getenv("DB_USER"),
-        "password": os.getenv("DB_PASSWORD")
-    }
+    # Load and validate the configuration
+    try:
+        config = Config.from_env()
+    except ValueError as e:
+        st.error(f"Configuration error: {e}")
+        logger.error("Configuration error: %s", e)
+        return None, None
     
     # Validate provider selection
     model_provider = model_provider.lower()
@@ -134,50 +137,12 @@ def initialize_agent(model_provider="ollama"):
         logger.warning("Groq selected but API key not available, falling back to Ollama")
         model_provider = "ollama"
     
-    # Load Ollama configuration
-    ollama_base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
-    sql_model = os.getenv("SQL_MODEL", "llama3.2:7b")
-    conversation_model = os.getenv("CONVERSATION_MODEL", "llama3.2:7b")
-    classifier_model = os.getenv("CLASSIFIER_MODEL", "phi3:mini")
-    
-    # Load Groq configuration
-    groq_api_key = os.getenv("GROQ_API_KEY")
-    groq_sql_model = os.getenv("GROQ_SQL_MODEL", "llama-3.1-8b-instant")
-    groq_conversation_model = os.getenv("GROQ_CONVERSATION_MODEL", "llama-3.1-8b-instant")
-    groq_classifier_model = os.getenv("GROQ_CLASSIFIER_MODEL", "llama-3.1-8b-instant")
-    
-    # Load classifier configuration
-    use_embeddings_classifier = os.getenv("CLASSIFIER_TYPE", "llm").lower() == "embeddings"
-    
-    # Load RAG configuration (optional)
-    rag_config = None
-    summaries_dir = os.getenv("SUMMARIES_DIR")
-    if summaries_dir and os.path.exists(summaries_dir):
-        rag_config = {
-            "summaries_dir": summaries_dir,
-            "embedding_model": os.getenv("EMBEDDING_MODEL", "nomic-embed-text"),
-            "chroma_db_dir": os.getenv("CHROMA_DB_DIR", "./chroma_db")
-        }
-    
     try:
-        agent = SQLAgent(
-            db_config=db_config,
-            ollama_base_url=ollama_base_url,
-            sql_model=sql_model,
-            conversation_model=conversation_model,
-            classifier_model=classifier_model,
-            rag_config=rag_config,
-            use_embeddings_classifier=use_embeddings_classifier,
-            model_provider=model_provider,
-            groq_api_key=groq_api_key,
-            groq_sql_model=groq_sql_model,
-            groq_conversation_model=groq_conversation_model,
-            groq_classifier_model=groq_classifier_model
-        )
+        agent = SQLAgent.from_config(config, model_provider=model_provider)
         return agent, model_provider
     except Exception as e:
         st.error(f"Error initializing agent: {str(e)}")
-        logger.error(f"Initialization error: {str(e)}")
+        logger.error("Initialization error: %s", e)
         return None, None
 
 
@@ -428,14 +393,28 @@ def main():
                     try:
                         # Track response time
                         start_time = time.time()
-                        result = st.session_state.agent.query(user_input)
+                        
+                        # Display the response while it is generated
+                        chunks = queue.Queue()
+                        future = st.session_state.agent.submit_query(user_input, on_chunk=chunks.put)
+                        
+                        def stream_response():
+                            while not (future.done() and chunks.empty()):
+                                try:
+                                    yield chunks.get(timeout=0.05)
+                                except queue.Empty:
+                                    continue
+                        
+                        streamed = st.write_stream(stream_response())
+                        result = future.result()
                         end_time = time.time()
                         response_time = end_time - start_time
                         
                         response = result.get("response", "No response generated.")
                         
-                        # Display response
-                        st.markdown(response)
+                        # Display response (if nothing was streamed)
+                        if not streamed:
+                            st.markdown(response)
                         
                         # Display metadata
                         metadata = {
@@ -507,7 +486,7 @@ def main():
                     except Exception as e:
                         error_msg = f"❌ Error: {str(e)}"
                         st.error(error_msg)
-                        logger.error(f"Query processing error: {str(e)}", exc_info=True)
+                        logger.error("Query processing error: %s", e, exc_info=True)
                         
                         st.session_state.messages.append({
                             "role": "assistant",
@@ -560,6 +539,13 @@ def main():
             col1, col2 = st.columns(2)
             with col1:
                 if st.button("✅ Confirm", use_container_width=True):
+                    # Close the current agent (event loop thread, database pool, HTTP clients) before dropping it
+                    if st.session_state.agent is not None:
+                        try:
+                            st.session_state.agent.close()
+                        except Exception as e:
+                            logger.warning("Error closing previous agent: %s", e)
+                    
                     # Clear agent, conversation, and provider info
                     st.session_state.agent = None
                     st.session_state.model_provider = None
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the agent's pure helpers: SQL response cleanup, keyword prefilter,
+caches, schema slimming and templated answers.
+Run offline (no database or models needed): pytest agent/test/test_agent_helpers.py
+"""
+
+import asyncio
+import sys
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+# Add parent directory to path to import agent modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agent import DIRECT_ANSWER_NO_ROWS, RESULT_CACHE_SIZE, AgentState, PromptCache, SemanticQueryCache, SQLAgent
+from config import Config
+from rag_tool import RAGTool
+from sql_tool import SQLTool
+
+SCHEMA = """
+CREATE TABLE contenido (
+    id_contenido integer NOT NULL,
+    titulo character varying(200) NOT NULL
+);
+
+CREATE TABLE ratings (
+    id_rating integer NOT NULL,
+    id_contenido integer NOT NULL,
+    puntaje integer NOT NULL
+);
+-- ratings.id_contenido can be joined with contenido.id_contenido
+
+CREATE TABLE usuarios (
+    id_usuario integer NOT NULL,
+    nombre character varying(100) NOT NULL
+);
+"""
+
+
+def bare_agent() -> SQLAgent:
+    """SQLAgent with only the state the helpers read (no database, models or RAG)."""
+    agent = SQLAgent.__new__(SQLAgent)
+    agent._known_title_re = None
+    agent._schema_index = None
+    return agent
+
+
+# ----------------- _clean_sql_response -----------------
+
+def test_clean_sql_response_extracts_fenced_query():
+    response = "Here is the query:\n```sql\nSELECT titulo\nFROM contenido;\n```\nIt lists titles."
+    assert bare_agent()._clean_sql_response(response) == "SELECT titulo\nFROM contenido"
+
+
+def test_clean_sql_response_extracts_unfenced_query():
+    response = "Sure! SELECT COUNT(*) FROM usuarios; This counts the users."
+    assert bare_agent()._clean_sql_response(response) == "SELECT COUNT(*) FROM usuarios"
+
+
+def test_clean_sql_response_keeps_plain_query():
+    assert bare_agent()._clean_sql_response("  SELECT 1;  ") == "SELECT 1"
+
+
+# ----------------- _prefilter_classification -----------------
+
+def test_prefilter_routes_rankings_and_counts_to_sql():
+    agent = bare_agent()
+    assert agent._prefilter_classification("¿Cuántos usuarios hay?") == "SQL"
+    assert agent._prefilter_classification("How many users signed up?") == "SQL"
+
+
+def test_prefilter_routes_descriptions():
+    agent = bare_agent()
+    assert agent._prefilter_classification("Describe la trama de Mundos Paralelos") == "RAG"
+    assert agent._prefilter_classification("Describe las 3 películas más vistas") == "HYBRID"
+
+
+def test_prefilter_leaves_undecided_title_queries_to_the_classifier():
+    assert bare_agent()._prefilter_classification("¿Qué opinan de Terror Nocturno?") is None
+
+
+# ----------------- PromptCache -----------------
+
+def test_prompt_cache_is_keyed_by_model_and_prompt():
+    cache = PromptCache(maxsize=4)
+    cache.put("model-a", "prompt", "a")
+    assert cache.get("model-a", "prompt") == "a"
+    assert cache.get("model-b", "prompt") is None
+
+
+def test_prompt_cache_evicts_least_recently_used():
+    cache = PromptCache(maxsize=2)
+    cache.put("m", "first", "1")
+    cache.put("m", "second", "2")
+    cache.get("m", "first")
+    cache.put("m", "third", "3")
+    assert cache.get("m", "first") == "1"
+    assert cache.get("m", "second") is None
+    assert cache.get("m", "third") == "3"
+
+
+def test_rag_tool_reuses_embeddings_from_a_shared_cache():
+    class Embeddings:
+        def embed_queries(self, texts):
+            self.requested = texts
+            return [[float(len(text))] for text in texts]
+
+    cache = PromptCache(maxsize=4)
+    cache.put("nomic-embed-text", "amor", [1.0])
+    tool = RAGTool.__new__(RAGTool)
+    tool.embedding_model = "nomic-embed-text"
+    tool.embeddings = Embeddings()
+    tool._embedding_cache = cache
+
+    assert tool._embed_queries(["amor", "terror"]) == [[1.0], [6.0]]
+    assert tool.embeddings.requested == ["terror"]
+    assert cache.get("nomic-embed-text", "terror") == [6.0]
+
+
+def test_result_cache_hits_are_independent_copies():
+    agent = bare_agent()
+    agent._result_cache = PromptCache(RESULT_CACHE_SIZE)
+    agent._response_cache = None
+    stored = {"response": "42", "results": {"rows": [(42,)]}, "rag_results": {}, "error": ""}
+    agent._result_cache.put("result", "how many users?", (time.monotonic(), stored))
+
+    first = asyncio.run(agent.aquery("How many  users?"))
+    first["results"]["rows"].append((0,))
+    second = asyncio.run(agent.aquery("how many users?"))
+
+    assert second["cache_hit"] is True
+    assert second["cache_kind"] == "exact"
+    assert second["results"] == {"rows": [(42,)]}
+    assert stored == {"response": "42", "results": {"rows": [(42,)]}, "rag_results": {}, "error": ""}
+
+
+# ----------------- SemanticQueryCache -----------------
+
+def test_semantic_cache_returns_result_for_similar_query():
+    cache = SemanticQueryCache(threshold=0.95)
+    cache.put([1.0, 0.0, 0.0], "top 5 movies", {"response": "five"})
+    assert cache.get([0.99, 0.01, 0.0], "top 5 movies") == {"response": "five"}
+
+
+def test_semantic_cache_results_are_independent_copies():
+    cache = SemanticQueryCache(threshold=0.95)
+    stored = {"response": "five", "results": {"rows": [("Amor",)]}}
+    cache.put([1.0, 0.0, 0.0], "top 5 movies", stored)
+    stored["results"]["rows"].clear()
+    cache.get([1.0, 0.0, 0.0], "top 5 movies")["results"]["rows"].append(("Otra",))
+    assert cache.get([1.0, 0.0, 0.0], "top 5 movies")["results"] == {"rows": [("Amor",)]}
+
+
+def test_semantic_cache_hits_are_reported_as_semantic():
+    agent = bare_agent()
+    agent._result_cache = None
+    agent._response_cache = SemanticQueryCache(threshold=0.95)
+    agent._response_cache.put([1.0, 0.0, 0.0], "top 5 movies", {"response": "five"})
+
+    async def embed(state):
+        return [0.99, 0.01, 0.0]
+
+    agent._embed_user_query = embed
+    result = asyncio.run(agent.aquery("best 5 movies"))
+    assert result["cache_hit"] is True
+    assert result["cache_kind"] == "semantic"
+
+
+def test_semantic_cache_misses_dissimilar_query():
+    cache = SemanticQueryCache(threshold=0.95)
+    cache.put([1.0, 0.0, 0.0], "top 5 movies", {"response": "five"})
+    assert cache.get([0.0, 1.0, 0.0], "top 5 movies") is None
+
+
+def test_semantic_cache_never_matches_different_numbers():
+    cache = SemanticQueryCache(threshold=0.95)
+    cache.put([1.0, 0.0, 0.0], "top 5 movies", {"response": "five"})
+    assert cache.get([1.0, 0.0, 0.0], "top 10 movies") is None
+
+
+def test_semantic_cache_expires_entries():
+    cache = SemanticQueryCache(threshold=0.95, ttl=0)
+    cache.put([1.0, 0.0, 0.0], "top 5 movies", {"response": "five"})
+    assert cache.get([1.0, 0.0, 0.0], "top 5 movies") is None
+
+
+def test_semantic_cache_is_opt_in(monkeypatch):
+    for name, value in {"DB_HOST": "localhost", "DB_PORT": "5432", "DB_NAME": "streaming", "DB_USER": "user"}.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.delenv("SEMANTIC_CACHE", raising=False)
+    assert Config.from_env().semantic_cache is False
+    monkeypatch.setenv("SEMANTIC_CACHE", "true")
+    assert Config.from_env().semantic_cache is True
+
+
+# ----------------- split_schema / _slim_schema -----------------
+
+def test_split_schema_returns_one_block_per_table():
+    tables = SQLTool.split_schema(SCHEMA)
+    assert list(tables) == ["contenido", "ratings", "usuarios"]
+    assert tables["ratings"].startswith("\nCREATE TABLE ratings (")
+    assert "ratings.id_contenido can be joined with contenido.id_contenido" in tables["ratings"]
+
+
+def test_slim_schema_keeps_named_tables_and_join_partners():
+    slimmed = bare_agent()._slim_schema("¿Cuál es el puntaje promedio en ratings?", SCHEMA)
+    assert "CREATE TABLE ratings" in slimmed
+    assert "CREATE TABLE contenido" in slimmed
+    assert "CREATE TABLE usuarios" not in slimmed
+
+
+def test_fused_classification_prompt_keeps_the_full_schema():
+    # A HYBRID question naming only usuarios still needs contenido for its titles
+    class LLMCalls:
+        async def ainvoke(self, llm, prompt):
+            self.prompt = prompt
+            return '{"query_type": "HYBRID", "sql_query": "SELECT 1"}'
+
+    async def get_schema():
+        return SCHEMA
+
+    agent = bare_agent()
+    agent.rag_tool = object()
+    agent.slim_schema = True
+    agent._aget_schema = get_schema
+    agent._llm_calls = LLMCalls()
+    agent.fused_llm = None
+    agent.model_provider = "ollama"
+    agent.sql_model = "sqlcoder"
+    agent._classification_cache = PromptCache()
+    agent._sql_prompt_prefixes = OrderedDict()
+
+    state = asyncio.run(agent._classify_and_generate_sql(AgentState(user_query="Resumen de lo que vieron los usuarios de Córdoba")))
+    assert state.query_type == "HYBRID"
+    assert "CREATE TABLE contenido" in agent._llm_calls.prompt
+    assert "CREATE TABLE usuarios" in agent._llm_calls.prompt
+
+
+def test_slim_schema_falls_back_to_full_schema_without_a_match():
+    assert bare_agent()._slim_schema("¿Qué hay de nuevo?", SCHEMA) is SCHEMA
+
+
+def test_slim_schema_returns_the_same_string_for_the_same_tables():
+    agent = bare_agent()
+    first = agent._slim_schema("usuarios activos", SCHEMA)
+    second = agent._slim_schema("nombres de usuarios", SCHEMA)
+    assert first is second
+
+
+# ----------------- _direct_sql_answer -----------------
+
+def sql_state(columns, rows, query_type="SQL", **results) -> AgentState:
+    return AgentState(
+        query_type=query_type,
+        sql_results={"success": True, "columns": columns, "rows": rows, "row_count": len(rows), **results}
+    )
+
+
+def test_direct_answer_templates_small_results():
+    state = sql_state(["total"], [(42,)])
+    assert SQLAgent._direct_sql_answer(state) == "total: 42"
+
+
+def test_direct_answer_reports_empty_results():
+    assert SQLAgent._direct_sql_answer(sql_state(["titulo"], [])) == DIRECT_ANSWER_NO_ROWS
+
+
+def test_direct_answer_shows_nulls_as_not_available():
+    assert SQLAgent._direct_sql_answer(sql_state(["titulo", "puntaje"], [("Amor", None)])) == "titulo: Amor, puntaje: N/A"
+
+
+def test_direct_answer_defers_large_truncated_or_non_sql_results():
+    assert SQLAgent._direct_sql_answer(sql_state(["id"], [(i,) for i in range(10)])) is None
+    assert SQLAgent._direct_sql_answer(sql_state(["id"], [(1,)], truncated=True)) is None
+    assert SQLAgent._direct_sql_answer(sql_state(["titulo"], [("Amor",)], query_type="HYBRID")) is None
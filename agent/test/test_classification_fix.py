@@ -3,6 +3,7 @@
 Query classification test.
 Verifies that queries are correctly classified as SQL, RAG, or HYBRID.
 """
+import asyncio
 import os
 import sys
 from pathlib import Path
@@ -13,7 +14,7 @@ load_dotenv()
 # Add parent directory to path to import agent module
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from agent import SQLAgent
+from agent import AgentState, SQLAgent
 
 print("\n🔬 Testing Classification Fix")
 print("="*60)
@@ -71,9 +72,9 @@ test_queries = [
 print("\nTesting classification:\n")
 correct = 0
 for query, expected in test_queries:
-    state = {"user_query": query}
-    result = agent._classify_query(state)
-    got = result.get('query_type', 'UNKNOWN')
+    state = AgentState(user_query=query)
+    result = asyncio.run(agent._classify_query(state))
+    got = result.query_type
     status = "✅" if got == expected else "❌"
     if got == expected:
         correct += 1
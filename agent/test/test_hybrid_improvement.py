@@ -88,13 +88,14 @@ for i, query in enumerate(test_queries, 1):
             
             # Check SQL results
             if result['results'].get('success'):
-                sql_data = result['results'].get('results', [])
+                columns = result['results'].get('columns', [])
+                sql_data = result['results'].get('rows', [])
                 print(f"\n✓ SQL Results ({len(sql_data)} rows):")
                 for row in sql_data[:3]:  # Show first 3
-                    print(f"  - {row}")
+                    print(f"  - {dict(zip(columns, row))}")
                 
                 # Check if titulo is in results
-                if sql_data and 'titulo' in sql_data[0]:
+                if sql_data and 'titulo' in columns:
                     print(f"\n✓ Results contain 'titulo' field ✓")
                 else:
                     print(f"\n✗ WARNING: Results do NOT contain 'titulo' field!")
@@ -4,6 +4,7 @@ RAG functionality test suite.
 Tests RAG initialization, query classification, and document retrieval.
 """
 
+import asyncio
 import os
 import sys
 from pathlib import Path
@@ -15,7 +16,7 @@ load_dotenv()
 # Add parent directory to path to import agent module
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from agent import SQLAgent
+from agent import AgentState, SQLAgent
 
 def get_agent_config():
     """Get standard agent configuration."""
@@ -98,9 +99,9 @@ def test_query_classification():
     print("\nTesting query classification:")
     all_correct = True
     for query, expected_type in test_queries:
-        state = {"user_query": query}
-        result = agent._classify_query(state)
-        classified_type = result.get('query_type', 'UNKNOWN')
+        state = AgentState(user_query=query)
+        result = asyncio.run(agent._classify_query(state))
+        classified_type = result.query_type
         is_correct = classified_type == expected_type
         all_correct = all_correct and is_correct
         status = "✅" if is_correct else "⚠️"
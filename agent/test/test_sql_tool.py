@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the SQL rewriting done before queries reach PostgreSQL.
+Run offline (no database needed): pytest agent/test/test_sql_tool.py
+"""
+
+import sys
+from collections import OrderedDict
+from decimal import Decimal
+from pathlib import Path
+
+# Add parent directory to path to import agent modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+from psycopg2 import ProgrammingError
+
+from sql_tool import SQLTool, parameterize_sql
+
+
+class RecordingCursor:
+    """Cursor stand-in that records the statements it is asked to execute."""
+
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, statement, params=None):
+        self.executed.append((statement, params))
+
+
+class PrepareFailingCursor(RecordingCursor):
+    """RecordingCursor whose PREPARE statements fail, as for a query PostgreSQL cannot prepare."""
+
+    def execute(self, statement, params=None):
+        if statement.startswith("PREPARE"):
+            raise ProgrammingError("could not prepare")
+        super().execute(statement, params)
+
+
+class StatementConnection:
+    """Connection stand-in with the prepared statement registry of PreparedConnection."""
+
+    def __init__(self):
+        self.statements = OrderedDict()
+
+
+def test_decimal_compared_with_integer_column_keeps_its_value():
+    # puntaje is INTEGER: an untyped $1 would be prepared as int4 and 3.5 rounded to 4
+    text, params = parameterize_sql("SELECT * FROM Ratings r WHERE r.puntaje > 3.5")
+    assert text == "SELECT * FROM Ratings r WHERE r.puntaje > $1::numeric"
+    assert params == [Decimal("3.5")]
+
+
+def test_decimal_placeholder_is_typed_in_prepare():
+    tool = SQLTool({})
+    conn, cursor = StatementConnection(), RecordingCursor()
+    tool._execute_prepared(conn, cursor, "SELECT * FROM Ratings WHERE puntaje >= 4.5")
+
+    prepare, execute = cursor.executed
+    assert prepare[0].endswith("AS SELECT * FROM Ratings WHERE puntaje >= $1::numeric")
+    assert execute[1] == [Decimal("4.5")]
+
+
+def test_integer_placeholders_match_inline_literal_types():
+    text, params = parameterize_sql("SELECT id FROM Contenido WHERE id = 7 OR id > 3000000000 LIMIT 10")
+    assert text == "SELECT id FROM Contenido WHERE id = $1::integer OR id > $2::bigint LIMIT $3::integer"
+    assert params == [7, 3000000000, 10]
+
+
+def test_string_literals_become_parameters():
+    text, params = parameterize_sql("SELECT * FROM Contenido WHERE titulo = 'It''s Me';")
+    assert text == "SELECT * FROM Contenido WHERE titulo = $1"
+    assert params == ["It's Me"]
+
+
+def test_typed_literals_and_positional_numbers_stay_inline():
+    query = "SELECT genero, COUNT(*) FROM Visualizaciones WHERE fecha > DATE '2024-01-01' GROUP BY 1 ORDER BY 2"
+    text, params = parameterize_sql(query)
+    assert text == query
+    assert params == []
+
+
+def test_queries_differing_in_constants_share_a_statement():
+    first, _ = parameterize_sql("SELECT *\n  FROM Ratings\n  WHERE puntaje > 2.5")
+    second, _ = parameterize_sql("SELECT * FROM Ratings WHERE puntaje > 4.0")
+    assert first == second
+
+
+def test_keywords_inside_string_literals_pass_validation():
+    tool = SQLTool({})
+    assert tool.validate_sql("SELECT * FROM Contenido WHERE titulo = 'Delete Me'") == (True, None)
+    assert tool.validate_sql("SELECT * FROM Contenido WHERE titulo = 'Update' -- drop it later") == (True, None)
+
+
+def test_keywords_in_code_are_rejected():
+    tool = SQLTool({})
+    is_valid, error = tool.validate_sql("SELECT * FROM Contenido; DROP TABLE Contenido")
+    assert not is_valid
+    assert "DROP" in error
+
+
+def test_only_single_select_statements_pass_validation():
+    tool = SQLTool({})
+    assert tool.validate_sql("SELECT COUNT(*) FROM Usuarios;") == (True, None)
+    assert tool.validate_sql("SELECT ';' AS separador") == (True, None)
+    assert tool.validate_sql("UPDATE Usuarios SET nombre = 'x'") == (False, "Only SELECT queries are allowed")
+    assert tool.validate_sql("SELECT 1; SELECT 2") == (False, "Multiple SQL statements are not allowed")
+    assert tool.validate_sql("   ") == (False, "Empty or invalid SQL query")
+
+
+def test_limit_is_appended_only_without_one():
+    assert SQLTool._limit_rows("SELECT * FROM Usuarios;") == "SELECT * FROM Usuarios\nLIMIT 1001"
+    assert SQLTool._limit_rows("SELECT * FROM Usuarios LIMIT 5") == "SELECT * FROM Usuarios LIMIT 5"
+
+
+def test_backslash_escaped_string_payload_is_rejected():
+    # The E-string ends after '\'' in PostgreSQL, so the DROP runs as a second statement
+    tool = SQLTool({})
+    for query in (
+        "SELECT E'\\''; DROP TABLE usuarios; --LIMIT'",
+        "SELECT e'\\''; DROP TABLE usuarios; --'",
+        "SELECT '\\'; DROP TABLE usuarios; --'",
+    ):
+        is_valid, error = tool.validate_sql(query)
+        assert not is_valid, query
+        assert "Backslash" in error
+
+
+def test_dollar_quote_lookalikes_do_not_hide_statements():
+    tool = SQLTool({})
+    # a$x$ is an identifier and $1 a parameter, not the start of a dollar-quoted string
+    assert not tool.validate_sql("SELECT a$x$; DROP TABLE usuarios; $x$")[0]
+    assert not tool.validate_sql("SELECT $1$; DROP TABLE usuarios; $1$")[0]
+    # Real dollar-quoted strings are data
+    assert tool.validate_sql("SELECT $x$; DROP TABLE usuarios; $x$ AS texto") == (True, None)
+    assert tool.validate_sql("SELECT $$ delete $$ AS texto") == (True, None)
+
+
+def test_comment_variants_do_not_hide_statements():
+    tool = SQLTool({})
+    # Line comments also end at a carriage return
+    assert not tool.validate_sql("SELECT 1 -- comentario\r; DROP TABLE usuarios")[0]
+    # Block comments nest in PostgreSQL, so the first */ does not end this one
+    assert tool.validate_sql("SELECT 1 /* a /* b */ ' */ ; DROP TABLE usuarios; --'") == (
+        False, "Nested comments are not allowed in SQL queries"
+    )
+    assert tool.validate_sql("SELECT 1 /* drop */ -- see /* delete") == (True, None)
+
+
+def test_escaped_quotes_inside_literals_stay_in_the_literal():
+    tool = SQLTool({})
+    assert tool.validate_sql("SELECT * FROM Contenido WHERE titulo = 'It''s; DROP TABLE usuarios'") == (True, None)
+    assert tool.validate_sql("SELECT E'a''; DROP TABLE usuarios; --' AS texto") == (True, None)
+
+
+def test_limit_inside_literals_or_comments_does_not_count():
+    assert SQLTool._limit_rows("SELECT * FROM Visualizaciones -- no limit") == (
+        "SELECT * FROM Visualizaciones -- no limit\nLIMIT 1001"
+    )
+    assert SQLTool._limit_rows("SELECT * FROM Contenido WHERE titulo = 'Fetch'") == (
+        "SELECT * FROM Contenido WHERE titulo = 'Fetch'\nLIMIT 1001"
+    )
+    assert SQLTool._limit_rows("SELECT * FROM (SELECT * FROM Contenido LIMIT 5) c") == (
+        "SELECT * FROM (SELECT * FROM Contenido LIMIT 5) c"
+    )
+
+
+def test_escape_strings_comments_and_dollar_quotes_are_not_parameterized():
+    for query in (
+        "SELECT E'\\''; DROP TABLE usuarios; --LIMIT'",
+        "SELECT $x$ where id = 5 $x$, \"id = 3\" FROM Contenido",
+        "SELECT titulo FROM Contenido /* WHERE id = 7 */",
+        "SELECT titulo FROM Contenido -- WHERE titulo = 'x'",
+        "SELECT X'1F', U&'d0061' AS texto",
+    ):
+        assert parameterize_sql(query) == (query, []), query
+    # Literals outside the kept text are still parameters, and whitespace is left as written
+    assert parameterize_sql("SELECT $$ = 5 $$,  titulo FROM Contenido WHERE id = 5") == (
+        "SELECT $$ = 5 $$,  titulo FROM Contenido WHERE id = $1::integer", [5]
+    )
+
+
+def test_unprepared_fallback_runs_only_single_validated_statements():
+    tool = SQLTool({})
+    cursor = PrepareFailingCursor()
+    with pytest.raises(ProgrammingError):
+        tool._execute_prepared(StatementConnection(), cursor, "SELECT E'\\''; DROP TABLE usuarios; --LIMIT'")
+    assert cursor.executed == []
+
+    tool._execute_prepared(StatementConnection(), cursor, "SELECT titulo FROM Contenido")
+    assert cursor.executed == [("SELECT titulo FROM Contenido", None)]